@@ -0,0 +1,500 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''
+    Measures the time taken by some of the more performance-sensitive parts of
+    the raws package, mostly for comparing optimized code paths against the
+    more straightforward ones they replace.
+
+    Usage: python benchmark.py [dfpath] [benchmark names...]
+
+    When no Dwarf Fortress directory is given, the input directory from the
+    default configuration files is used. When no benchmark names are given,
+    all benchmarks are run.
+'''
+
+import sys
+import os
+
+pydwarf_root = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../..'))
+sys.path.append(pydwarf_root)
+sys.path.append(os.path.join(pydwarf_root, 'lib'))
+
+import time
+import gc
+import fnmatch
+import multiprocessing
+import shutil
+import tempfile
+
+import raws
+import pydwarf
+
+
+
+benchmarks = []
+
+def benchmark(func):
+    '''Register a function as a benchmark.'''
+    benchmarks.append(func)
+    return func
+
+def measure(func, repeat=3):
+    '''Get the best time in seconds out of several calls to some function.'''
+    best = None
+    for i in xrange(0, repeat):
+        start = time.time()
+        func()
+        duration = time.time() - start
+        if best is None or duration < best: best = duration
+    return best
+
+def report(name, duration, baseline=None):
+    '''Print the result of a measurement.'''
+    if baseline:
+        print('    %-32s %8.3fs  (%.2fx)' % (name, duration, baseline / duration if duration else 0))
+    else:
+        print('    %-32s %8.3fs' % (name, duration))
+
+def objectsdata(dfpath):
+    '''Get the token data, minus header lines, of files in raw/objects.'''
+    data = []
+    objectspath = os.path.join(dfpath, 'raw/objects')
+    for name in sorted(os.listdir(objectspath)):
+        if name.endswith('.txt'):
+            with open(os.path.join(objectspath, name), 'rb') as rawfile:
+                parts = rawfile.read().split('\n', 1)
+                if len(parts) == 2 and parts[1]: data.append(parts[1])
+    return data
+
+
+
+@benchmark
+def parse(dfpath):
+    '''Compare tokenparse.parseplural against tokenparse.parsebulk.'''
+    data = objectsdata(dfpath)
+
+    for content in data:
+        tokens = raws.parsebulk(content)
+        if ''.join(token.fullstr() for token in tokens) != content:
+            raise ValueError('Bulk parser failed to round-trip some content.')
+        if not raws.helpers.tokensequal(tokens, raws.parseplural(content)):
+            raise ValueError('Bulk parser produced different tokens than parseplural.')
+
+    count = sum(len(raws.parsebulk(content)) for content in data)
+    print('Parsing %d tokens from %d files.' % (count, len(data)))
+    baseline = measure(lambda: [raws.parseplural(content) for content in data])
+    report('parseplural', baseline)
+    report('parsebulk', measure(lambda: [raws.parsebulk(content) for content in data]), baseline)
+
+
+
+@benchmark
+def cache(dfpath):
+    '''Compare reading raw/objects with and without a warm rawcache.'''
+    cachepath = tempfile.mkdtemp()
+    try:
+        read = lambda cache=None: raws.dir(root=dfpath, paths='raw/objects', cache=cache)
+        cold = read(cachepath)
+        warm = read(cachepath)
+        if cold.cache.misses != len(cold.files) or warm.cache.hits != len(warm.files):
+            raise ValueError('Cache failed to hit on a second read of unchanged files.')
+        if not warm.equals(read()):
+            raise ValueError('Cached files differ from parsed files.')
+        baseline = measure(lambda: read())
+        report('no cache', baseline)
+        report('warm cache', measure(lambda: read(cachepath)), baseline)
+    finally:
+        shutil.rmtree(cachepath)
+
+
+
+
+@benchmark
+def lazy(dfpath):
+    '''Compare reading all files eagerly and lazily, then getting one object.'''
+    read = lambda lazy: raws.dir(root=dfpath, lazy=lazy)
+    df = read(True)
+    entity = df.getobj('ENTITY:MOUNTAIN')
+    rawfiles = [file for file in df.iterfiles() if isinstance(file, raws.rawfile)]
+    parsed = sum(1 for file in rawfiles if not file.lazy)
+    print('Getting ENTITY:MOUNTAIN parsed %d of %d raws files.' % (parsed, len(rawfiles)))
+    if not read(False).getobj('ENTITY:MOUNTAIN').equals(entity):
+        raise ValueError('Lazily loaded dir found a different object.')
+    baseline = measure(lambda: read(False).getobj('ENTITY:MOUNTAIN'))
+    report('eager', baseline)
+    report('lazy', measure(lambda: read(True).getobj('ENTITY:MOUNTAIN')), baseline)
+
+
+
+
+@benchmark
+def workers(dfpath):
+    '''Compare reading all files serially and using a pool of processes.'''
+    count = max(2, multiprocessing.cpu_count())
+    read = lambda workers: raws.dir(root=dfpath, workers=workers)
+    settings = raws.dir.parallelsize, raws.dir.parallelsample, raws.dir.parallelgain
+    raws.dir.parallelsize, raws.dir.parallelsample, raws.dir.parallelgain = 0, 0, 0 # Use the pool whether or not it's measured to be faster
+    try:
+        serial = read(None)
+        if not serial.equals(read(count)) or sorted(serial.files) != sorted(read(count).files):
+            raise ValueError('Reading in parallel produced different files.')
+        baseline = measure(lambda: read(None))
+        report('serial', baseline)
+        report('%d workers' % count, measure(lambda: read(count)), baseline)
+    finally:
+        raws.dir.parallelsize, raws.dir.parallelsample, raws.dir.parallelgain = settings
+
+
+
+@benchmark
+def objindex(dfpath):
+    '''Compare getting objects by id using object indexes and by checking every token.'''
+    df = raws.dir(root=dfpath)
+    ids = [obj.arg() for obj in df.allobj()][::25]
+    # Passing any extra filter argument makes getobj fall back to checking every token
+    scan = lambda: [df.getobj(exact_id=id, except_value=None) for id in ids]
+    indexed = lambda: [df.getobj(exact_id=id) for id in ids]
+    if any(a is not b for a, b in zip(scan(), indexed())):
+        raise ValueError('Object index found different objects than a scan.')
+    print('Getting %d objects by id.' % len(ids))
+    baseline = measure(scan, repeat=1)
+    report('scan', baseline)
+    report('indexed', measure(indexed), baseline)
+
+
+
+@benchmark
+def propspan(dfpath):
+    '''Compare getting every object's properties using spans and using termination filters.'''
+    objects = raws.dir(root=dfpath).allobj()
+    # Passing an argument for the tokens iterator makes prop queries fall back to termination filters
+    filtered = lambda: [obj.allprop(skip=True) for obj in objects]
+    spanned = lambda: [obj.allprop() for obj in objects]
+    if any(not raws.helpers.tokensequal(a, b) for a, b in zip(filtered(), spanned())):
+        raise ValueError('Property spans found different properties than termination filters.')
+    print('Getting properties of %d objects.' % len(objects))
+    baseline = measure(filtered)
+    report('termination filter', baseline)
+    report('span', measure(spanned), baseline)
+
+
+
+@benchmark
+def filters(dfpath):
+    '''Compare the per-token cost of evaluating filters directly and using compiled evaluators.'''
+    tokens = list(raws.dir(root=dfpath).itokens())
+    cases = {
+        'exact_value': raws.tokenfilter(exact_value='NAME'),
+        'value_in, args_count': raws.tokenfilter(value_in=('CREATURE', 'CASTE', 'BODY'), args_count=1),
+        're_value, exact_arg': raws.tokenfilter(re_value='ITEM_.*', exact_arg=((0, 'ITEM_WEAPON_AXE_BATTLE'),)),
+        'any of two filters': raws.tokenfilter(exact_value='NAME') | raws.tokenfilter(pretty='BODY:QUADRUPED'),
+    }
+    print('Evaluating filters for each of %d tokens.' % len(tokens))
+    for name, filter in sorted(cases.items()):
+        evaluate = filter.evaluator()
+        if any(filter(token, 0) != evaluate(token, 0) for token in tokens):
+            raise ValueError('Compiled evaluator for filter %s disagreed with the filter.' % name)
+        baseline = measure(lambda: [filter(token, 0) for token in tokens])
+        duration = measure(lambda: [evaluate(token, 0) for token in tokens])
+        print('  %s (%.0fns per token direct, %.0fns compiled)' % (name, 1e9 * baseline / len(tokens), 1e9 * duration / len(tokens)))
+        report('direct', baseline)
+        report('compiled', duration, baseline)
+
+
+
+@benchmark
+def planner(dfpath):
+    '''Compare queries over a whole dir for a particular value using value indexes and scanning.'''
+    df = raws.dir(root=dfpath)
+    # Passing a tokens iterator prevents the query from using value indexes
+    scan = lambda: df.all('MAXAGE', tokens=df.tokens())
+    indexed = lambda: df.all('MAXAGE')
+    if not scan().equals(indexed()):
+        raise ValueError('Query using value indexes found different tokens than a scan.')
+    print('Getting %d MAXAGE tokens from %d tokens.' % (len(indexed()), sum(1 for token in df.itokens())))
+    baseline = measure(scan)
+    report('scan', baseline)
+    report('indexed', measure(indexed), baseline)
+
+
+
+@benchmark
+def order(dfpath):
+    '''Compare getting the lengths of files and comparing token order using order indexes and walking.'''
+    files = [file for file in raws.dir(root=dfpath).iterfiles() if isinstance(file, raws.rawfile)]
+    pairs = [(file.index(-1), file.index(0)) for file in files if len(file) > 1]
+    # Passing any argument for the tokens iterator makes length count tokens by walking the file
+    walked = lambda: [file.length(step=1) for file in files] + [any(token is last for token in first.tokens()) for last, first in pairs]
+    indexed = lambda: [len(file) for file in files] + [last > first for last, first in pairs]
+    if walked() != indexed():
+        raise ValueError('Order indexes disagreed with walking the files.')
+    print('Getting lengths of %d files and comparing order of %d pairs of tokens.' % (len(files), len(pairs)))
+    baseline = measure(walked)
+    report('walk', baseline)
+    report('indexed', measure(indexed), baseline)
+
+
+
+@benchmark
+def snapshot(dfpath):
+    '''Compare copying every token in a dir against taking a snapshot and modifying one object.'''
+    df = raws.dir(root=dfpath)
+    def copied():
+        copy = df.copy()
+        for file in copy.iterfiles():
+            if isinstance(file, raws.rawfile): file.parse()
+        return copy
+    def snapshot():
+        snapshot = df.snapshot()
+        df.getobj('CREATURE:DWARF').get('NAME').prefix = ' '
+        return snapshot
+    if not copied().equals(df) or not snapshot().equals(copied()):
+        raise ValueError('Snapshot differs from a copy of the dir.')
+    print('Copying %d files containing %d tokens.' % (len(df), sum(1 for token in df.itokens())))
+    baseline = measure(copied)
+    report('copy all tokens', baseline)
+    report('snapshot', measure(snapshot), baseline)
+
+
+
+@benchmark
+def write(dfpath):
+    '''Compare writing every file in raw/objects against writing only the modified ones, serially and on threads.'''
+    df = raws.dir(root=dfpath, paths='raw/objects')
+    df.getobj('CREATURE:DWARF').add('NOCTURNAL')
+    destpath = tempfile.mkdtemp()
+    try:
+        def rewrite():
+            shutil.rmtree(os.path.join(destpath, 'raw/objects'), ignore_errors=True)
+            for file in df.iterfiles():
+                # Calling contentfile.write directly bypasses the check for unmodified files
+                raws.contentfile.write(file, destpath) if isinstance(file, raws.rawfile) else file.write(destpath)
+        def write(threads=None):
+            df.clean(destpath)
+            df.write(destpath, threads=threads)
+        rewrite()
+        contents = dict((str(file), open(file.dest(destpath), 'rb').read()) for file in df.iterfiles())
+        write()
+        if any(open(file.dest(destpath), 'rb').read() != contents[str(file)] for file in df.iterfiles()):
+            raise ValueError('Writing only modified files produced different output.')
+        modified = [file for file in df.iterfiles() if isinstance(file, raws.rawfile) and not file.unmodified()]
+        print('Writing %d files of which %d were modified.' % (len(df), len(modified)))
+        baseline = measure(rewrite)
+        report('rewrite all', baseline)
+        report('write modified', measure(write), baseline)
+        report('write modified, 4 threads', measure(lambda: write(4)), baseline)
+    finally:
+        shutil.rmtree(destpath)
+
+
+
+@benchmark
+def lookup(dfpath):
+    '''Compare finding files by directory and by glob pattern using the path index and scanning.'''
+    df = raws.dir(root=dfpath)
+    scanunder = lambda: sorted(str(file) for file in df.iterfiles() if str(file).startswith('raw/objects/'))
+    scanglob = lambda: sorted(str(file) for file in df.iterfiles() if fnmatch.fnmatchcase(str(file), 'raw/objects/creature_*.txt'))
+    if [str(file) for file in df.filesunder('raw/objects')] != scanunder() or [str(file) for file in df.glob('raw/objects/creature_*.txt')] != scanglob():
+        raise ValueError('Path index found different files than scanning.')
+    print('Finding files among %d.' % len(df))
+    baseline = measure(lambda: [scanunder() for i in xrange(0, 100)])
+    report('scan for directory', baseline)
+    report('filesunder', measure(lambda: [df.filesunder('raw/objects') for i in xrange(0, 100)]), baseline)
+    baseline = measure(lambda: [scanglob() for i in xrange(0, 100)])
+    report('scan for pattern', baseline)
+    report('glob', measure(lambda: [df.glob('raw/objects/creature_*.txt') for i in xrange(0, 100)]), baseline)
+
+
+
+@benchmark
+def headers(dfpath):
+    '''Compare getting objects one at a time using the dir's header index and checking every file's first token.'''
+    df = raws.dir(root=dfpath)
+    ids = [token.args[0] for token in df.allobj('CREATURE')][:50]
+    def scan(type):
+        match_types = df.getobjheadername(type)
+        return [file.root() for file in df.iterfiles() if isinstance(file, raws.queryable) and (
+            file.peekroot() is not None and file.peekroot().value == 'OBJECT' and file.peekroot().nargs() == 1 and file.peekroot().args[0] in match_types
+        )]
+    if sorted(id(token) for token in scan('CREATURE')) != sorted(id(token) for token in df.getobjheaders('CREATURE')):
+        raise ValueError('Header index found different headers than checking every file.')
+    print('Getting %d creatures from %d files.' % (len(ids), len(df)))
+    def getall(getheaders):
+        for id in ids:
+            for header in getheaders('CREATURE'):
+                if raws.queryableobj.objindex(header).get('CREATURE', id, None, None): break
+    baseline = measure(lambda: getall(scan))
+    report('check every file', baseline)
+    report('header index', measure(lambda: getall(df.getobjheaders)), baseline)
+
+
+
+@benchmark
+def batch(dfpath):
+    '''Compare running several queries over a whole dir one at a time and as a single batch.'''
+    df = raws.dir(root=dfpath)
+    values = ('NAME', 'BODY', 'SPEED', 'CASTE', 'DESCRIPTION', 'BIOME', 'PREFSTRING', 'TISSUE_LAYER', 'ATTACK', 'EXTRACT')
+    queries = dict((value, {'exact_value': value, 'until_exact_value': 'NONEXISTENT_TOKEN'}) for value in values)
+    separate = lambda: dict((value, df.all(exact_value=value, until_exact_value='NONEXISTENT_TOKEN')) for value in values)
+    results = df.batch(queries)
+    if any([id(token) for token in results[value]] != [id(token) for token in tokens] for value, tokens in separate().iteritems()):
+        raise ValueError('Batch query found different tokens than separate queries.')
+    print('Running %d queries which check every token.' % len(queries))
+    baseline = measure(separate)
+    report('separate queries', baseline)
+    report('batch, one pass', measure(lambda: df.batch(queries, tokens=df.tokens())), baseline)
+    report('batch, value indexes', measure(lambda: df.batch(queries)), baseline)
+
+
+
+@benchmark
+def remove(dfpath):
+    '''Compare removing every creature object one at a time and all at once.'''
+    df = raws.dir(root=dfpath)
+    def onebyone(copy):
+        for obj in copy.allobj('CREATURE'): obj.removeselfandprops()
+    bulk = lambda copy: copy.removeallobj('CREATURE')
+    first, second = df.copy(), df.copy()
+    onebyone(first)
+    bulk(second)
+    if any(file.getcontent() != second.getfile(str(file)).getcontent() for file in first.iterfiles() if isinstance(file, raws.rawfile)):
+        raise ValueError('Removing objects all at once left different tokens than removing them one at a time.')
+    print('Removing %d creatures.' % len(df.allobj('CREATURE')))
+    copies = [df.copy() for i in xrange(0, 6)]
+    baseline = measure(lambda: onebyone(copies.pop()))
+    report('one at a time', baseline)
+    report('removeallobj', measure(lambda: bulk(copies.pop())), baseline)
+
+
+
+@benchmark
+def permit(dfpath):
+    '''Compare permitting reactions for every entity one at a time and all at once.'''
+    df = raws.dir(root=dfpath)
+    ids = [reaction.arg() for reaction in df.allobj('REACTION')]
+    def onebyone(copy):
+        for entity in copy.allobj('ENTITY'):
+            for id in ids: entity.addprop(raws.token(value='PERMITTED_REACTION', args=[id]))
+    bulk = lambda copy: raws.entitypermits(copy.allobj('ENTITY')).permit(
+        raws.token(value='PERMITTED_REACTION', args=[id]) for id in ids
+    )
+    first, second = df.copy(), df.copy()
+    onebyone(first)
+    bulk(second)
+    if any(file.getcontent() != second.getfile(str(file)).getcontent() for file in first.iterfiles() if isinstance(file, raws.rawfile)):
+        raise ValueError('Permitting objects all at once left different tokens than permitting them one at a time.')
+    print('Permitting %d reactions for %d entities.' % (len(ids), len(df.allobj('ENTITY'))))
+    copies = [df.copy() for i in xrange(0, 6)]
+    baseline = measure(lambda: onebyone(copies.pop()))
+    report('one at a time', baseline)
+    report('entitypermits', measure(lambda: bulk(copies.pop())), baseline)
+
+
+
+@benchmark
+def addprop(dfpath):
+    '''Compare adding many properties to creatures with and without remembering where they go.'''
+    df = raws.dir(root=dfpath)
+    def scanning(copy):
+        for creature in copy.allobj('CREATURE'):
+            beforevalues, aftervalues = creature.propbeforeafter()
+            for index in xrange(0, 20):
+                addafter = creature.lastprop(value_in=aftervalues, until_value_in=beforevalues) or creature
+                addafter.add(raws.token(value='BENCHMARK', args=[str(index)]))
+    def cached(copy):
+        for creature in copy.allobj('CREATURE'):
+            for index in xrange(0, 20): creature.addprop(raws.token(value='BENCHMARK', args=[str(index)]))
+    first, second = df.copy(), df.copy()
+    scanning(first)
+    cached(second)
+    if any(file.getcontent() != second.getfile(str(file)).getcontent() for file in first.iterfiles() if isinstance(file, raws.rawfile)):
+        raise ValueError('Adding properties with cached anchors left different tokens than finding the anchor every time.')
+    print('Adding 20 properties each to %d creatures.' % len(df.allobj('CREATURE')))
+    copies = [df.copy() for i in xrange(0, 6)]
+    baseline = measure(lambda: scanning(copies.pop()))
+    report('scanning', baseline)
+    report('addprop', measure(lambda: cached(copies.pop())), baseline)
+
+
+
+@benchmark
+def templates(dfpath):
+    '''Compare making tokens from the same strings by parsing them every time and by using templates.'''
+    strings = ['[CASTE:FEMALE]\n\t[FEMALE]', '[PERMITTED_REACTION:TAN_A_HIDE]', '[NAME:dwarf:dwarves:dwarven]', '[BODY_SIZE:0:0:4000]']
+    tokens = raws.token(value='NAME', args=['dwarf', 'dwarves', 'dwarven'])
+    def parsing():
+        for index in xrange(0, 5000):
+            for string in strings: raws.tokenparse.parsevariable(string, implicit=True)
+            tokens.equals(raws.token(pretty='[NAME:dwarf:dwarves:dwarven]'))
+    def templated():
+        for index in xrange(0, 5000):
+            for string in strings: raws.tokentemplate.get(string).variable()
+            tokens.equals('[NAME:dwarf:dwarves:dwarven]')
+    print('Making tokens from %d strings 5000 times each.' % len(strings))
+    baseline = measure(parsing)
+    report('parsing', baseline)
+    report('tokentemplate', measure(templated), baseline)
+
+
+
+@benchmark
+def querycache(dfpath):
+    '''Compare repeating the same queries with and without the query cache.'''
+    df = raws.dir(root=dfpath)
+    creatures = df.allobj('CREATURE')
+    def queries():
+        for index in xrange(0, 20):
+            df.allobj('CREATURE')
+            df.getobj('ENTITY', 'MOUNTAIN')
+            for creature in creatures: creature.getprop('CASTE')
+    baseline = measure(queries)
+    raws.querycache.enabled = True
+    try:
+        duration = measure(queries)
+    finally:
+        raws.querycache.enabled = False
+    print('Repeating queries for %d creatures 20 times.' % len(creatures))
+    report('uncached', baseline)
+    report('querycache', duration, baseline)
+
+
+
+@benchmark
+def memory(dfpath):
+    '''Measure the memory and time used to read and hold all of the tokens in a dir.'''
+    if not os.path.isfile('/proc/self/statm'):
+        print('Skipping memory benchmark because /proc/self/statm is unavailable.')
+        return
+    rss = lambda: int(open('/proc/self/statm').read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    gc.collect()
+    before = rss()
+    start = time.time()
+    df = raws.dir(root=dfpath)
+    duration = time.time() - start
+    gc.collect()
+    used = rss() - before
+    count = sum(1 for token in df.itokens())
+    print('Holding %d tokens used %.1f MB, %d bytes per token.' % (count, used / 1e6, used / count if count else 0))
+    report('read', duration)
+
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    if args and os.path.isdir(args[0]):
+        dfpath = args.pop(0)
+    else:
+        conf = pydwarf.config.load(root=pydwarf_root, args={
+            'log': '',
+            'verbose': False,
+        })
+        dfpath = conf.input
+    
+    # Repeated queries would otherwise measure the query cache instead of whatever they're meant to
+    raws.querycache.enabled = False
+
+    for func in benchmarks:
+        if not args or func.__name__ in args:
+            print('Running benchmark %s.' % func.__name__)
+            func(dfpath)
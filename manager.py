@@ -69,6 +69,12 @@ def parseargs():
     parser.add_argument('-v', '--verbose', help='set stdout logging level to DEBUG', action='store_true')
     parser.add_argument('-hver', '--hackversion', help='indicate DFHack version', type=str)
     parser.add_argument('-l', '--log', help='output log file to path', type=str)
+    parser.add_argument('-ca', '--cache', help='cache parsed raws files in this directory', type=str)
+    parser.add_argument('-lz', '--lazy', help='wait to parse raws files until scripts need them', action='store_true', default=None)
+    parser.add_argument('-w', '--workers', help='read raws files using this many processes', type=int)
+    parser.add_argument('-th', '--threads', help='write files using this many threads', type=int)
+    parser.add_argument('-ln', '--link', help='link unmodified files to the output directory instead of copying them', action='store_true', default=None)
+    parser.add_argument('-inc', '--incremental', help='store backups incrementally with a manifest for each', action='store_true', default=None)
     parser.add_argument('-ls', '--list', help='list available scripts', action='store_true')
     parser.add_argument('-js', '--jscripts', help='specify scripts given a json array', type=str)
     parser.add_argument('-m', '--meta', help='show metadata for scripts', nargs='*', type=str)
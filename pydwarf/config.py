@@ -37,7 +37,7 @@ class config(object):
     def __init__(
         self,
         version=None, paths=None, hackversion=None, input=None, output=None, backup=None,
-        scripts=[], packages=[], verbose=False, log='logs/%s.txt' % timestamp,
+        scripts=[], packages=[], verbose=False, log='logs/%s.txt' % timestamp, cache=None, lazy=None, workers=None, threads=None, incremental=None, link=None,
     ):
         '''Initialize a config object.'''
         self.version = version          # Dwarf Fortress version, for handling script compatibility metadata
@@ -50,6 +50,12 @@ class config(object):
         self.packages = packages        # These packages are imported (probably because they contain PyDwarf scripts)
         self.verbose = verbose          # Log DEBUG messages to stdout if True, otherwise only INFO and above
         self.log = log                  # Log file goes here
+        self.cache = cache              # Parsed raws files are cached in this directory, if specified
+        self.lazy = lazy                # Raws files aren't parsed until scripts need their tokens, if True
+        self.workers = workers          # Raws files are read using this many processes
+        self.threads = threads          # Files are written using this many threads
+        self.incremental = incremental  # Backups are kept in a deduplicated store with a manifest for each, if True
+        self.link = link                # Unmodified files are linked to the output directory instead of copied, if True
         
     @staticmethod
     def load(root=None, json='config.json', yaml='config.yaml', override='config.py', logoverridefailure=False, args=None):
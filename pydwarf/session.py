@@ -36,7 +36,7 @@ class session(object):
         self.conf = conf
         self.dfversion = conf.version
         if conf.input and os.path.isdir(conf.input):
-            self.df = raws.dir(root=conf.input, dest=conf.output, paths=conf.paths, version=conf.version, log=log)
+            self.df = raws.dir(root=conf.input, dest=conf.output, paths=conf.paths, version=conf.version, log=log, cache=conf.cache, lazy=bool(conf.lazy), workers=conf.workers, threads=conf.threads, link=bool(conf.link))
         else:
             log.error('Specified input directory %s does not exist.' % conf.input)
             
@@ -178,20 +178,46 @@ class session(object):
         self.df.write(dest=dest, *args, **kwargs)
         
     def backup(self, dest=None, skipfails=False):
-        '''Backup inputted Dwarf Fortress directory.'''
+        '''
+            Backup inputted Dwarf Fortress directory. If the incremental
+            setting is true then files are added to a raws.filestore in the
+            backup directory and the name of the new manifest is returned.
+        '''
         if dest is None: dest = self.conf.backup
         if not dest: raise ValueError('Failed to backup files because no destination was provided.')
         
         log.info('Backing up raws to desination %s.' % dest)
+        store = self.raws.filestore(dest) if self.conf.incremental else None
+        storepaths = []
         for path in self.conf.paths:
             srcpath = os.path.join(self.conf.input, path)
             destpath = os.path.join(dest, path)
             
-            if not os.path.isdir(os.path.dirname(destpath)): os.makedirs(os.path.dirname(destpath))
+            if not os.path.isfile(srcpath) and not os.path.isdir(srcpath):
+                if skipfails: raise ValueError('Failed to backup path %s because it refers to neither a file nor a directory.' % srcpath)
+            elif store is not None:
+                storepaths.append(path)
+            else:
+                if not os.path.isdir(os.path.dirname(destpath)): os.makedirs(os.path.dirname(destpath))
+                if os.path.isfile(srcpath):
+                    shutil.copy2(srcpath, destpath)
+                else:
+                    self.raws.copytree(srcpath, destpath)
+                    
+        if store is not None:
+            name = store.store(self.conf.input, storepaths)
+            log.info('Stored backup %s in %s.' % (name, store))
+            return name
             
-            if os.path.isfile(srcpath):
-                shutil.copy2(srcpath, destpath)
-            elif os.path.isdir(srcpath):
-                self.raws.copytree(srcpath, destpath)
-            elif skipfails:
-                raise ValueError('Failed to backup path %s because it refers to neither a file nor a directory.' % srcpath)
+    def restore(self, name=None, dest=None, backup=None):
+        '''
+            Restore files from an incremental backup, given the name of its
+            manifest or using the most recent one. Files are restored to the
+            input directory unless another destination is given.
+        '''
+        if dest is None: dest = self.conf.input
+        if backup is None: backup = self.conf.backup
+        if not backup: raise ValueError('Failed to restore files because no backup directory was provided.')
+        
+        log.info('Restoring backup %s from %s to destination %s.' % (name or 'latest', backup, dest))
+        self.raws.filestore(backup).restore(dest, name)
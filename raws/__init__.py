@@ -14,19 +14,26 @@ The raws package provides querying and modification functionality for Dwarf Fort
 
 raws.dir: An entire directory of raws files, stored as a dictionary of files.
 raws.token: A single token within a raws file, for example [CREATURE:DWARF] or [INORGANIC:IRON].
+raws.tokentemplate: Tokens parsed once from a string, from which new tokens can be made cheaply and repeatedly.
 raws.tokenlist: Extends Python's inbuilt list class with additional, specialized functionality.
 raws.queryable: Many raws classes extend this class, which provides token querying functionality.
 raws.queryableobj: An extension of the queryable class which adds methods optimized for finding object tokens, like the [CREATURE:DWARF] token which is underneath [OBJECT:CREATURE] in the creature_standard file.
+raws.querycache: Keeps the results of recent queries on a dir or file until its tokens change.
 raws.tokenfilter: Used by queryable objects' query method to find tokens meeting specific conditions.
 raws.boolfilter: Can be used in place of a tokenfilter for operations like Filter A OR Filter B.
 raws.color: Contains a convenience class and objects for dealing with colors in the DF raws.
 raws.copytree: A general utility method for copying an entire directory and its contents from one location to another.
+raws.entitypermits: Records which objects entities permit, and permits objects for many entities at once.
 raws.objecs: Contains information and helper functions for knowing which object types belong to which headers, such as how [BUILDING_WORKSHOP:ID] belongs to [OBJECT:BUILDING].
 
 raws.rawfile: A single raws file, stored as a linked list.
 raws.reffile: A file stored as a reference to a source file.
+raws.reftree: Stands in for a directory of reffiles until a file inside it is needed.
 raws.binfile: A file stored in a string, as its binary content.
 raws.basefile: A base class which other file types inherit from.
+raws.rawcache: Stores parsed raws files on disk so that unchanged files can be loaded without tokenizing them again.
+raws.filestore: Stores copies of files on disk by the hash of their content, with a manifest for each set of files stored.
+raws.symboltable: Canonicalizes the strings and argument tuples of tokens so that repeated ones are shared.
 
 raws.filter: A convenience alias for raws.tokenfilter.
 raws.parse: A convenience alias for raws.token.parse, which accepts an input string and parses it into a token or tokenlist.
@@ -37,10 +44,15 @@ raws.parse: A convenience alias for raws.token.parse, which accepts an input str
 
 import queryable, queryableobj, queryableadd, queryableprop, queryableaddprop
 import queryresult
+import querycache
 import token
 import tokenargs
-import basefile, contentfile, reffile, binfile, rawfile
+import tokentemplate
+import basefile, contentfile, reffile, reftree, binfile, rawfile
 import filefactory
+import rawcache
+import filestore
+import symboltable
 import tokenlist
 import tokengenerator
 import tokenparse
@@ -50,6 +62,7 @@ import helpers
 
 import copytree
 import objects
+import entitypermits
 import color
 
 
@@ -65,25 +78,33 @@ queryableprop = queryableprop.queryableprop
 queryableaddprop = queryableaddprop.queryableaddprop
 
 queryresult = queryresult.queryresult
+querycache = querycache.querycache
 
 tokenlist = tokenlist.tokenlist
 tokengenerator = tokengenerator.tokengenerator
 
 token = token.token
 tokenargs = tokenargs.tokenargs
+tokentemplate = tokentemplate.tokentemplate
 
 basefile = basefile.basefile
 contentfile = contentfile.contentfile
 reffile = reffile.reffile
+reftree = reftree.reftree
 binfile = binfile.binfile
 rawfile = rawfile.rawfile
 filefactory = filefactory.filefactory
+rawcache = rawcache.rawcache
+filestore = filestore.filestore
+symboltable = symboltable.symboltable
 
 dir = dir.dir
 
 copytree = copytree.copytree
+entitypermits = entitypermits.entitypermits
 
 parseplural = tokenparse.parseplural
+parsebulk = tokenparse.parsebulk
 parsesingular = tokenparse.parsesingular
 parsevariable = tokenparse.parsevariable
 
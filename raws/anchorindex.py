@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+
+
+class anchorindex(object):
+    '''
+        Internal: Records the token after which addprop adds properties to
+        each object in a file, so that adding several properties to the same
+        object doesn't look through its properties every time. Files keep one
+        of these and start a new one whenever their tokens change, except that
+        addprop moves an object's anchor along to account for what it added.
+    '''
+
+    def __init__(self, generation=None):
+        '''Initialize an empty index.'''
+        self.generation = generation
+        self.anchors = {} # Maps ids of object tokens to tuples of the object token and its anchor
+
+    def get(self, object):
+        '''Get the anchor for an object token, or None if it isn't known.'''
+        entry = self.anchors.get(id(object))
+        return entry[1] if entry is not None and entry[0] is object else None
+
+    def set(self, object, anchor):
+        '''Record the anchor for an object token.'''
+        self.anchors[id(object)] = (object, anchor)
+
+    @staticmethod
+    def advance(anchor, added, beforevalues, aftervalues):
+        '''
+            Get the new anchor after some tokens were added immediately after
+            the old one. That's the last of them which ought to come before
+            added properties, if one does before any which ought to come after.
+        '''
+        for token in added:
+            if token.value in beforevalues: break
+            if token.value in aftervalues: anchor = token
+        return anchor
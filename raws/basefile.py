@@ -2,6 +2,7 @@
 # coding: utf-8
 
 import os
+import shutil
 import traceback
 
 
@@ -123,8 +124,54 @@ class basefile(object):
         '''
         dest = os.path.join(path, str(self))
         dir = os.path.dirname(dest)
-        if makedir and not os.path.isdir(dir): os.makedirs(dir)
+        if makedir and not os.path.isdir(dir):
+            try:
+                os.makedirs(dir)
+            except OSError:
+                # Another thread may have made the same directory in the meantime
+                if not os.path.isdir(dir): raise
         return dest
+        
+    def copyto(self, dest):
+        '''
+            Internal: Copy the file at this file's path to a destination path,
+            using the dir's filecopier so that it's linked instead if the dir
+            was told to link files.
+        '''
+        if self.dir is not None:
+            self.dir.copier.copy(self.path, dest)
+        else:
+            shutil.copy2(self.path, dest)
+        
+    def writestaged(self, dest, write):
+        '''
+            Internal: Write a file to a destination path by calling a function
+            with a temporary path next to it, and then renaming the temporary
+            file. A write which fails partway through never leaves a partial
+            file at the destination.
+        '''
+        temppath = '%s.tmp' % dest
+        try:
+            write(temppath)
+            if os.name == 'nt' and os.path.isfile(dest): os.remove(dest) # Windows can't rename over existing files
+            os.rename(temppath, dest)
+        except:
+            if os.path.isfile(temppath): os.remove(temppath)
+            raise
+        
+    def uptodate(self, dest):
+        '''
+            Internal: Check whether the file at a destination path is already
+            a copy of the file at this file's path, like one written by an
+            earlier call to write, judging by their sizes and modified times.
+        '''
+        if not self.path or not os.path.isfile(self.path) or not os.path.isfile(dest):
+            return False
+        elif os.path.abspath(dest) == self.path:
+            return True
+        else:
+            srcstat, deststat = os.stat(self.path), os.stat(dest)
+            return srcstat.st_size == deststat.st_size and int(srcstat.st_mtime) == int(deststat.st_mtime)
                 
     def remove(self):
         '''Remove this file from the dir object to which it belongs.'''
@@ -34,8 +34,15 @@ class contentfile(basefile.basefile):
         '''Write the file contents to a path or file-like object.'''
         if file is None or isinstance(file, basestring):
             dest = self.dest(file, makedir=True)
-            with open(dest, 'wb') as file:
-                file.write(self.getcontent())
+            self.writestaged(dest, self.writeto)
+        else:
+            self.writeto(file)
+            
+    def writeto(self, file):
+        '''Internal: Write the file contents to a file path or file-like object.'''
+        if isinstance(file, basestring):
+            with open(file, 'wb') as out:
+                self.writeto(out)
         else:
             file.write(self.getcontent())
             
@@ -2,7 +2,10 @@
 # coding: utf-8
 
 import os
-import shutil
+import time
+import marshal
+import multiprocessing
+import multiprocessing.pool
 
 import queryableobj
 
@@ -11,15 +14,48 @@ import queryableobj
 class dir(queryableobj.queryableobj):
     '''Represents files contained within a Dwarf Fortress directory.'''
     
-    def __init__(self, root=None, dest=None, paths=None, version=None, log=None, **kwargs):
+    '''
+        Reading files with more than one worker is only considered when the
+        files which will be parsed as raws add up to at least this many bytes.
+    '''
+    parallelsize = 16 * 1024 * 1024
+    
+    '''
+        Before starting any workers, files are read one at a time until at
+        least this many bytes of raws have been parsed. The time taken to
+        parse them is compared to the time this process would take to build
+        the same tokens from what workers send back.
+    '''
+    parallelsample = 1024 * 1024
+    
+    '''
+        The rest of the files are read using workers only if that's estimated
+        to take less time than reading them one at a time by at least this
+        factor. Building tokens from what workers send back takes almost as
+        long as parsing them, so usually it isn't.
+    '''
+    parallelgain = 2.0
+    
+    def __init__(self, root=None, dest=None, paths=None, version=None, log=None, cache=None, lazy=False, workers=None, threads=None, link=False, **kwargs):
         '''Initialize a dir object.'''
         self.files = {}
         self.filenames = {}
+        self.trees = {}     # Maps names of reftrees to the trees, which stand in for the files inside them
+        self.pathindex = pathtrie.pathtrie() # Indexes files by the directories in their paths
+        self.cachedheaderindex = None # Index of the headers which files begin with, built when needed
+        self.cachedquerycache = None # Results of recent queries on the dir, made when needed
+        self.querygeneration = 0 # Incremented whenever a file is added or removed or anything about a file's tokens changes
         self.root = root    # Root input directory
         self.dest = dest    # Root output directory
         self.paths = paths  # Only worry about these file paths in input/output directories
         self.version = version
         self.log = log # TODO: take this out, it doesn't belong here. move logging statements to session or get rid of them entirely.
+        self.cache = rawcache.rawcache(cache) if isinstance(cache, basestring) else cache # Parsed raws files are cached here
+        self.lazy = lazy    # Wait to parse raws files until their tokens are needed, and read directories of reffiles as reftrees
+        self.workers = workers # Read files using this many processes
+        self.threads = threads # Write files using this many threads
+        self.copier = filecopier.filecopier(link) # Copies or links unmodified files when writing
+        self.symbols = symboltable.symboltable() # Strings and arguments shared by tokens in this dir
         if root: self.read(**kwargs)
         
     def __str__(self):
@@ -53,8 +89,9 @@ class dir(queryableobj.queryableobj):
     def __contains__(self, item):
         '''Check if the dir contains a file name or object.'''
         if isinstance(item, basefile.basefile):
-            return any(item is file for file in self.iterfiles())
+            return self.pathindex.key(item) is not None
         else:
+            if self.trees: self.expandtrees(item)
             return item in self.files.iterkeys() or item in self.filenames.iterkeys()
             
     def __len__(self):
@@ -111,6 +148,7 @@ class dir(queryableobj.queryableobj):
         if isinstance(name, basefile.basefile):
             return name if name in self else None
         
+        if self.trees: self.expandtrees(name)
         file = self.files.get(name)
         if file is None:
             file = self.filenames.get(name)
@@ -132,9 +170,39 @@ class dir(queryableobj.queryableobj):
         return file
         
     def iterfiles(self, *args, **kwargs):
-        '''Iterate through the dir's file objects.'''
+        '''
+            Iterate through the dir's file objects. Reftrees are not expanded,
+            so the files inside them aren't included.
+        '''
         return self.files.itervalues(*args, **kwargs)
         
+    def filesunder(self, path='', ext=None):
+        '''
+            Get a list of the files located anywhere under a directory, such
+            as filesunder('raw/objects'), sorted by path. If an extension is
+            given, such as '.txt', then only files with that extension are
+            included. Reftrees in the way are expanded.
+        '''
+        path = path.replace('\\', '/').strip('/')
+        if self.trees: self.expandtrees(path, under=True)
+        return [file for key, file in sorted(self.pathindex.under(path)) if ext is None or file.ext == ext]
+    files_under = filesunder
+        
+    def glob(self, pattern):
+        '''
+            Get a list of the files whose paths match a glob pattern, such as
+            glob('raw/objects/creature_*.txt'), sorted by path. Each part of
+            the pattern matches one part of a path, except that a part which
+            is just ** matches any number of directories, so glob('**/*.lua')
+            gets every lua file. Reftrees in the way are expanded.
+        '''
+        pattern = pattern.replace('\\', '/').strip('/')
+        if self.trees:
+            parts = pattern.split('/')
+            literal = next((index for index, part in enumerate(parts) if any(char in part for char in '*?[')), len(parts))
+            self.expandtrees('/'.join(parts[:literal]), under=True)
+        return [file for key, file in sorted(dict(self.pathindex.glob(pattern)).iteritems())]
+        
     def add(self, auto=None, **kwargs):
         '''Add a file to the dir.'''
         if auto is not None:
@@ -266,17 +334,38 @@ class dir(queryableobj.queryableobj):
         if file.dir is not self and file.dir is not None:
             raise ValueError('Failed to add file %s to dir because it already belongs to another dir. You probably meant to remove the file first or to add a copy.' % file)
         
-        if str(file) in self.files:
+        key = str(file)
+        
+        if self.trees: self.expandtrees(key)
+        
+        if key in self.files:
             if not replace: raise KeyError('Failed to add file %s to dir because it already contains a file by the same name.' % file)
-            self.remove(self.files[str(file)])
+            self.remove(self.files[key])
             
         file.dir = self
+        self.querygeneration += 1
         
-        self.files[str(file)] = file
+        self.files[key] = file
+        self.pathindex.add(key, file)
+        if self.cachedheaderindex is not None:
+            self.cachedheaderindex.add(file)
+            self.cachedheaderindex.reordered()
         
         if file.name not in self.filenames: self.filenames[file.name] = []
         self.filenames[file.name].append(file)
         
+        if isinstance(file, reftree.reftree): self.trees[key] = file
+        
+    def expandtrees(self, name, under=False):
+        '''
+            Internal: Replace reftrees which may contain a file with some name
+            or path with the files inside them. If under is True, then trees
+            located anywhere under the path are replaced too.
+        '''
+        for tree in [tree for tree in self.trees.itervalues() if tree.contains(name) or (under and tree.within(name))]:
+            self.remove(tree)
+            self.addfilestodicts(tree.expand())
+        
     def remove(self, file=None):
         '''Remove a file from this dir.'''
         
@@ -293,8 +382,15 @@ class dir(queryableobj.queryableobj):
                 del filenamelist[index]
                 break
         
-        self.files[str(file)].dir = None
-        del self.files[str(file)]
+        if self.cachedheaderindex is not None:
+            self.cachedheaderindex.remove(file)
+            self.cachedheaderindex.reordered()
+        self.querygeneration += 1
+        key = self.pathindex.remove(file)
+        if key is None: key = str(file)
+        self.files[key].dir = None
+        del self.files[key]
+        self.trees.pop(key, None)
         
     def addfile(self, filename=None, rfile=None, path=None):
         '''Deprecated: As of v1.0.2. Use the add method instead.'''
@@ -303,8 +399,15 @@ class dir(queryableobj.queryableobj):
         '''Deprecated: As of v1.0.2. Use the remove method instead.'''
         return self.remove(file if file is not None else name)
     
-    def read(self, root=None, paths=None, skipfails=False):
-        '''Reads raws from all text files in the specified directory.'''
+    def read(self, root=None, paths=None, skipfails=False, workers=None):
+        '''
+            Reads raws from all text files in the specified directory. If the
+            number of workers is greater than one then files may be classified
+            and parsed by that many processes in parallel, with the same
+            results as reading them one at a time, as described by readfiles. If the dir is lazy then each directory which
+            contains only files that would be read as reffiles is added as a
+            single reftree.
+        '''
         
         if root is None:
             if self.root is None: raise ValueError('Failed to read dir because no root directory was specified.')
@@ -315,81 +418,264 @@ class dir(queryableobj.queryableobj):
             paths = (paths,) if isinstance(paths, basestring) else paths
         else:
             paths = os.listdir(root)
+            
+        if workers is None: workers = self.workers
         
-        addeddirs = {}
+        entries = [] # Paths of files and empty directories to add, in order
+        trees = [] # Paths of directories to add as reftrees, and the names inside them
             
         for path in paths:
             path = os.path.join(root, path)
             
             if os.path.isdir(path):
-                for walkroot, walkdirs, walkfiles in os.walk(path):
+                walk = list(os.walk(path))
+                reftrees = self.findtrees(walk) if self.lazy else {}
+                tree = None
+                for walkroot, walkdirs, walkfiles in walk:
+                    
+                    # Add directories of reffiles as reftrees
+                    if tree is not None and walkroot.startswith(tree + os.sep): continue
+                    tree = None
+                    if walkroot in reftrees:
+                        tree = walkroot
+                        trees.append((walkroot, reftrees[walkroot]))
+                        continue
                     
                     # Add files
                     for name in walkfiles:
-                        filepath = os.path.join(walkroot, name)
-                        file = filefactory.filefactory(filepath, root=root, dir=self)
-                        addeddirs[os.path.abspath(os.path.dirname(filepath)).replace('\\', '/')] = True
-                        self.add(file)
+                        entries.append(os.path.join(walkroot, name))
                     
                     # Add empty directories
-                    for dir in walkdirs:
-                        dir = os.path.abspath(os.path.join(walkroot, dir)).replace('\\', '/')
-                        if not any([added.startswith(dir) for added in addeddirs.iterkeys()]):
-                            file = filefactory.filefactory(path=dir, root=root, dir=self)
-                            self.add(file)
+                    if walkroot != path and not walkfiles and not walkdirs:
+                        entries.append(os.path.abspath(walkroot).replace('\\', '/'))
             
             elif os.path.isfile(path):
-                file = filefactory.filefactory(path, root=root, dir=self)
-                addeddirs[os.path.abspath(os.path.dirname(path))] = True
-                self.add(file)
+                entries.append(path)
                 
             elif skipfails:
                 raise ValueError('Failed to read dir because a bad path %s was provided.' % path)
+                
+        for file in self.readfiles(root, entries, workers):
+            self.add(file)
+        for path, names in trees:
+            self.add(reftree.reftree(path=path, root=root, dir=self, names=names))
+            
+    def findtrees(self, walk):
+        '''
+            Internal: Used by read to find directories containing nothing but
+            files which would be read as reffiles, given the results of os.walk.
+            Returns a dict mapping the paths of those directories to the names
+            of the files and empty directories inside them.
+        '''
+        trees = {}
+        for walkroot, walkdirs, walkfiles in reversed(walk):
+            if all(filefactory.refname(name) for name in walkfiles):
+                names = set(os.path.splitext(name)[0] for name in walkfiles)
+                for name in walkdirs:
+                    subnames = trees.get(os.path.join(walkroot, name))
+                    if subnames is None: break
+                    names.update(subnames or (name,))
+                else:
+                    trees[walkroot] = names
+        return trees
+            
+    def readfiles(self, root, entries, workers):
+        '''
+            Internal: Used by read to create file objects for paths, in order.
+            Workers are only considered when there's more than one of them,
+            the dir isn't lazy, and the files which will be parsed as raws
+            add up to at least parallelsize bytes. Even then, files are first
+            read one at a time until parallelsample bytes of raws have been
+            parsed, measuring how long that took and how long building the
+            same tokens from what workers send back took. The rest of the
+            files are read by workers only if the measurements say it will be
+            faster by a factor of at least parallelgain, which it never will
+            with only one CPU.
+        '''
+        rawsize = lambda entry: os.path.getsize(entry) if filefactory.rawname(os.path.basename(entry)) and os.path.isfile(entry) else 0
+        cpus = multiprocessing.cpu_count()
+        if not workers or workers < 2 or self.lazy or sum(rawsize(entry) for entry in entries) < self.parallelsize:
+            for entry in entries: yield filefactory.filefactory(entry, root=root, dir=self)
+            return
+        
+        parsetime, buildtime, sampled = 0.0, 0.0, 0
+        index = 0
+        while index < len(entries) and sampled < self.parallelsample:
+            entry = entries[index]
+            index += 1
+            start = time.time()
+            file = filefactory.filefactory(entry, root=root, dir=self)
+            if isinstance(file, rawfile.rawfile):
+                parsetime += time.time() - start
+                result = (entry, 'raw', (file.noheader, marshal.dumps(rawcache.rawcache.pack(file.tokens()))))
+                start = time.time()
+                filefactory.postfactory(result, root=root, dir=self)
+                buildtime += time.time() - start
+                sampled += rawsize(entry)
+            yield file
         
-    def write(self, dest=None):
-        '''Writes raws to the specified directory.'''
+        # This process builds every token itself while the workers parse in parallel
+        estimate = max(buildtime, parsetime / min(workers, cpus))
+        if self.log: self.log.debug('Parsed %d bytes of raws in %.3fs, and building them again took %.3fs.' % (sampled, parsetime, buildtime))
+        if index < len(entries) and parsetime >= estimate * self.parallelgain:
+            files = self.readparallel(root, entries[index:], workers)
+        else:
+            files = (filefactory.filefactory(entry, root=root, dir=self) for entry in entries[index:])
+        for file in files: yield file
+            
+    def readparallel(self, root, paths, workers):
+        '''
+            Internal: Used by read to create file objects for paths using a
+            pool of worker processes.
+        '''
+        cache = self.cache.path if self.cache is not None else None
+        pool = multiprocessing.Pool(workers)
+        try:
+            results = pool.map(
+                filefactory.prefactory,
+                [(path, root, cache) for path in paths],
+                chunksize = max(1, len(paths) // (workers * 4))
+            )
+        finally:
+            pool.close()
+            pool.join()
+        return (filefactory.postfactory(result, root=root, dir=self) for result in results)
+        
+    def write(self, dest=None, threads=None):
+        '''
+            Writes raws to the specified directory. If the number of threads
+            is greater than one then that many files are written at a time.
+            Each file is written to a temporary path and then renamed, so
+            files are never left partially written. Unmodified files are
+            copied or linked by the dir's filecopier, and the number of bytes
+            copied and linked is logged afterwards.
+        '''
         dest = self.getdestforfileop(dest)
+        if threads is None: threads = self.threads
         if self.log: self.log.debug('Writing %d files to %s.' % (len(self.files), dest))
-        for file in self.files.itervalues():
+        copied, linked = self.copier.copied, self.copier.linked
+        files = self.files.values()
+        if threads and threads > 1 and len(files) > 1:
+            pool = multiprocessing.pool.ThreadPool(threads)
             try:
-                file.write(dest)
-            except UnicodeDecodeError as e:
-                if self.log: self.log.exception('Failed to write file %s to %s because of mismatched unicode and byte strings.' % (file, dest))
-            except Exception as e:
-                if self.log: self.log.exception('Failed to write file %s to %s.' % (file, dest))
+                pool.map(lambda file: self.writefile(file, dest), files)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            for file in files:
+                self.writefile(file, dest)
+        if self.log: self.log.info('Wrote files to %s with %d bytes copied and %d bytes linked.' % (
+            dest, self.copier.copied - copied, self.copier.linked - linked
+        ))
+                
+    def writefile(self, file, dest):
+        '''Internal: Used by write to write one file, logging failures.'''
+        try:
+            file.write(dest)
+        except UnicodeDecodeError as e:
+            if self.log: self.log.exception('Failed to write file %s to %s because of mismatched unicode and byte strings.' % (file, dest))
+        except Exception as e:
+            if self.log: self.log.exception('Failed to write file %s to %s.' % (file, dest))
             
     def clean(self, dest=None):
         '''
             Cleans an output directory, typically before writing, so that files
             that are present in the output directory but not in the dir object
-            won't stick around and interfere with things.
+            won't stick around and interfere with things. Files which the dir
+            object is going to write are left alone, so that writing can skip
+            those which are already up to date, and so are the files which
+            writing a directory would copy.
         '''
         dest = self.getdestforfileop(dest)
         if self.log: self.log.debug('Cleaning files in %s.' % dest)
-        for path in self.paths:
-            path = os.path.join(dest, path)
+        keep = set()
+        for file in self.iterfiles():
+            filedest = os.path.abspath(file.dest(dest))
+            keep.add(filedest)
+            if isinstance(file, reffile.reffile) and file.path and os.path.isdir(file.path):
+                for walkroot, walkdirs, walkfiles in os.walk(file.path):
+                    destroot = os.path.normpath(os.path.join(filedest, os.path.relpath(walkroot, file.path)))
+                    keep.add(destroot)
+                    keep.update(os.path.join(destroot, name) for name in walkfiles)
+        paths = (self.paths,) if isinstance(self.paths, basestring) else self.paths
+        for path in paths:
+            path = os.path.abspath(os.path.join(dest, path))
+            if not path.startswith(os.path.abspath(dest) + os.sep):
+                raise ValueError('Failed to clean path %s because it isn\'t inside the output directory %s.' % (path, dest))
             if os.path.isfile(path):
-                os.remove(path)
+                if path not in keep: self.removeunder(path)
             elif os.path.isdir(path):
-                shutil.rmtree(path)
+                walkeddirs = []
+                for walkroot, walkdirs, walkfiles in os.walk(path):
+                    if walkroot not in keep: walkeddirs.append(walkroot)
+                    for walkfile in walkfiles:
+                        filepath = os.path.join(walkroot, walkfile)
+                        if filepath not in keep: self.removeunder(filepath)
+                for walkroot in reversed(walkeddirs):
+                    if not os.listdir(walkroot): os.rmdir(walkroot)
+                
+    def removeunder(self, path):
+        '''Internal: Used by clean to remove a file from the output directory.'''
+        self.parseunder(path)
+        os.remove(path)
+                
+    def parseunder(self, path):
+        '''
+            Internal: Parse lazily-loaded files which were read from some path,
+            and stop other files from being written by copying it, so that they
+            can still be written after that path is removed.
+        '''
+        path = os.path.abspath(path)
+        for file in self.iterfiles():
+            if isinstance(file, rawfile.rawfile) and file.path and (file.path == path or file.path.startswith(path + os.sep)):
+                file.parse()
+                file.touch()
                 
     def copy(self):
-        '''Create a copy of this dir.'''
+        '''
+            Create a copy of this dir. Files' tokens aren't actually copied
+            until either the original or the copy of a file is modified, or
+            until the copy's tokens are accessed.
+        '''
         copy = dir()
         copy.root = self.root
         copy.dest = self.dest
         copy.paths = self.paths
         copy.version = self.version
         copy.log = self.log
+        copy.cache = self.cache
+        copy.lazy = self.lazy
+        copy.workers = self.workers
+        copy.threads = self.threads
+        copy.copier = self.copier
+        copy.symbols = self.symbols
         for file in self.iterfiles():
             copy.add(file=file.copy())
         return copy
             
+    def snapshot(self):
+        '''
+            Get a snapshot of this dir's files which can later be passed to
+            restore in order to discard changes made since then. Taking a
+            snapshot is cheap because files are copied only as they change.
+        '''
+        return self.copy()
+        
+    def restore(self, snapshot):
+        '''Replace this dir's files with copies of the files in a snapshot.'''
+        self.clear()
+        for file in snapshot.iterfiles():
+            self.add(file=file.copy())
+            
     def clear(self):
         '''Remove all files from this dir.'''
         for file in self.files.values(): self.remove(file)
         self.files = {}
         self.filenames = {}
+        self.trees = {}
+        self.pathindex.clear()
+        self.cachedheaderindex = None
         
     def reset(self):
         '''
@@ -415,28 +701,64 @@ class dir(queryableobj.queryableobj):
                 for token in file.tokens(*args, **kwargs):
                     yield token
                 
+    def valuetokens(self, values):
+        '''Internal: Get the tokens in all files having any of a set of values, in the same order as itokens.'''
+        for file in self.files.itervalues():
+            if isinstance(file, queryable.queryable):
+                tokens = file.valuetokens(values)
+                for token in (file.itokens() if tokens is None else tokens):
+                    yield token
+        
+    def headerindex(self):
+        '''
+            Internal: Get an index of the files in the dir by the OBJECT header
+            they begin with.
+        '''
+        if self.cachedheaderindex is None:
+            self.cachedheaderindex = headerindex.headerindex(self)
+        return self.cachedheaderindex
+        
+    def querycache(self):
+        '''Internal: Get the cache for results of queries on this dir.'''
+        if self.cachedquerycache is None:
+            self.cachedquerycache = querycache.querycache(self)
+        return self.cachedquerycache
+        
+    def filechanged(self, file):
+        '''
+            Internal: Called by a raws file belonging to the dir the first time
+            its tokens change after the header index last looked at it.
+        '''
+        if self.cachedheaderindex is not None: self.cachedheaderindex.add(file)
+        
     def getobjheaders(self, type=None):
         '''
             Gets OBJECT:X tokens where X is type. Is also prepared for special
-            cases like type=ITEM_PANTS matching OBJECT:ITEM.
+            cases like type=ITEM_PANTS matching OBJECT:ITEM. Files are found
+            using the dir's header index, and the tokens are in the same order
+            as the dir's files.
         '''
         
         match_types = self.getobjheadername(type)
         results = tokenlist.tokenlist()
-        for file in self.files.itervalues():
-            if isinstance(file, queryable.queryable):
-                root = file.root()
-                if root is not None and root.value == 'OBJECT' and root.nargs() == 1 and root.args[0] in match_types:
-                    results.append(root)
+        for file in self.headerindex().files(match_types):
+            results.append(file.root())
         return results
 
 
 
 import copytree
+import rawcache
+import filecopier
+import symboltable
+import pathtrie
+import headerindex
+import querycache
 import queryable
 import tokenlist
 import basefile
 import reffile
+import reftree
 import binfile
 import rawfile
 import filefactory
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+
+
+class entitypermits(object):
+    '''
+        Records which objects each of some entities permits, such as with
+        [PERMITTED_REACTION:ID], [PERMITTED_BUILDING:ID], or [WEAPON:ID], so
+        that whether an entity already permits an object can be checked
+        without looking through the entity's properties. Objects can also be
+        permitted for all of the entities at once, which finds where to add
+        tokens to each entity only once and adds all of them in one go.
+    '''
+
+    def __init__(self, entities):
+        '''Initialize given an iterable of ENTITY object tokens.'''
+        self.entities = list(entities)
+        self.permits = {} # Maps entity ids to sets of (value, id) tuples for the permission tokens they have
+        values = entitypermits.values()
+        for entity in self.entities:
+            self.permits[entity.arg()] = set(
+                (token.value, token.arglist[0]) for token in entity.allprop(value_in=values) if token.arglist
+            )
+
+    def __getitem__(self, entity):
+        '''Get the (value, id) tuples for the permission tokens of the entity with some id.'''
+        return self.permits[entity]
+
+    @staticmethod
+    def values():
+        '''Get the values of all tokens which permit objects.'''
+        return set(('PERMITTED_REACTION', 'PERMITTED_BUILDING')).union(
+            type.split('_')[1] for type in objects.objectsforheader('ITEM')
+        )
+
+    @staticmethod
+    def token(type, id, rarity=None):
+        '''
+            Get a token which permits an object of some type and id, like
+            [PERMITTED_REACTION:ID] for type REACTION, or [WEAPON:ID] for type
+            ITEM_WEAPON. Items accept a rarity as a second argument. Returns
+            None for types of objects which can't be permitted.
+        '''
+        if type == 'REACTION':
+            return rawstoken.token(value='PERMITTED_REACTION', args=[id])
+        elif type.startswith('BUILDING_'):
+            return rawstoken.token(value='PERMITTED_BUILDING', args=[id])
+        elif type.startswith('ITEM_'):
+            return rawstoken.token(value=type.split('_')[1], args=[id, rarity] if rarity else [id])
+        else:
+            return None
+
+    def permitted(self, entity, type, id):
+        '''Get whether the entity with some id permits an object of some type and id.'''
+        token = entitypermits.token(type, id)
+        return token is not None and (token.value, id) in self.permits[entity]
+
+    def permit(self, tokens):
+        '''
+            Add copies of some permission tokens, as given by the token method,
+            to every entity. The tokens end up in the same places as they would
+            by calling addprop on each entity for each token in turn.
+        '''
+        tokens = list(tokens)
+        if tokens:
+            for entity in self.entities:
+                # Tokens added by addprop one at a time each go immediately after the same anchor
+                entity.propanchor().add(helpers.copytokens(reversed(tokens)))
+                self.permits[entity.arg()].update((token.value, token.arglist[0]) for token in tokens)
+
+
+
+import objects
+import helpers
+import token as rawstoken
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import os
+import shutil
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None # Reflinks are only attempted where fcntl is available
+
+
+
+class filecopier(object):
+    '''
+        Copies files which a dir writes without changing them, such as
+        reffiles and raws files which weren't modified. When linking is
+        enabled, files are reflinked where the filesystem supports it, so the
+        copy shares storage with the original until either is changed, and
+        are otherwise hard linked. When neither works, for example because
+        the destination is on another device, files are copied as normal.
+        Keeps count of how many bytes were copied and how many linked.
+    '''
+
+    # Linux ioctl request for making a file share the storage of another
+    ficlone = 0x40049409
+
+    def __init__(self, link=False):
+        '''Initialize a copier, given whether it should try to link files.'''
+        self.link = link
+        self.copied = 0   # Bytes actually copied
+        self.linked = 0   # Bytes reflinked or hard linked rather than copied
+        self.lock = threading.Lock()
+
+    def __str__(self):
+        '''Get a string representation.'''
+        return '%d bytes copied, %d bytes linked' % (self.copied, self.linked)
+
+    def count(self, size, linked):
+        '''Internal: Record the size of a file which was copied or linked.'''
+        with self.lock:
+            if linked:
+                self.linked += size
+            else:
+                self.copied += size
+
+    def copy(self, src, dest):
+        '''
+            Copy the file at a source path to a destination path, keeping its
+            modified time, or link it if enabled. Any file already at the
+            destination is replaced. Note that changing a hard linked file in
+            place, rather than replacing it, also changes the source.
+        '''
+        if os.path.isfile(dest): os.remove(dest)
+        size = os.path.getsize(src)
+        linked = self.link and (self.reflink(src, dest) or self.hardlink(src, dest))
+        if not linked: shutil.copy2(src, dest)
+        self.count(size, linked)
+
+    def reflink(self, src, dest):
+        '''Internal: Try to reflink a file, and return whether it worked.'''
+        if fcntl is None: return False
+        try:
+            with open(src, 'rb') as srcfile, open(dest, 'wb') as destfile:
+                fcntl.ioctl(destfile.fileno(), filecopier.ficlone, srcfile.fileno())
+        except (IOError, OSError):
+            if os.path.isfile(dest): os.remove(dest)
+            return False
+        shutil.copystat(src, dest)
+        return True
+
+    def hardlink(self, src, dest):
+        '''Internal: Try to hard link a file, and return whether it worked.'''
+        if not hasattr(os, 'link'): return False
+        try:
+            os.link(src, dest)
+        except OSError:
+            return False
+        return True
+
+    def copytree(self, src, dest):
+        '''
+            Copy or link every file in a directory and its subdirectories to
+            a destination directory, skipping files which are at least as new
+            at the destination. Each file is copied to a temporary path and
+            then renamed, like files written by a dir.
+        '''
+        for walkroot, walkdirs, walkfiles in os.walk(src):
+            destroot = os.path.join(dest, os.path.relpath(walkroot, src))
+            if not os.path.isdir(destroot): os.makedirs(destroot)
+            for name in walkfiles:
+                srcpath, destpath = os.path.join(walkroot, name), os.path.join(destroot, name)
+                if not os.path.exists(destpath) or os.stat(srcpath).st_mtime - os.stat(destpath).st_mtime > 1:
+                    temppath = '%s.tmp' % destpath
+                    self.copy(srcpath, temppath)
+                    if os.name == 'nt' and os.path.isfile(destpath): os.remove(destpath)
+                    os.rename(temppath, destpath)
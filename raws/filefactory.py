@@ -2,6 +2,7 @@
 # coding: utf-8
 
 import os
+import marshal
 
 import reffile
 import binfile
@@ -45,3 +46,55 @@ def filefactory(path, log=None, **kwargs): # TODO: move this elsewhere and make
             log.debug(traceback.format_exc())
     
     return reffile.reffile(path=path, **kwargs)
+
+def refname(basename):
+    '''
+        Internal: Get whether filefactory makes a reffile for every file with
+        some name, so that it's known without having to read the file.
+    '''
+    return not basename.endswith('.txt') and basename not in binnames and basename not in rawnames
+
+def rawname(basename):
+    '''
+        Internal: Get whether filefactory might make a rawfile for a file with
+        some name, rather than a reffile or binfile.
+    '''
+    return basename.endswith('.txt') or basename in rawnames
+
+
+
+def prefactory(args):
+    '''
+        Internal: Used by dir.readparallel in worker processes. Creates a file
+        object for a path like filefactory does and then returns a picklable
+        representation of it which postfactory can turn back into a file.
+        Tokens are packed the same way as for a rawcache and marshalled,
+        because pickling the packed tokens takes about as long as parsing.
+    '''
+    path, root, cache = args
+    file = filefactory(path, root=root, dir=dir.dir(cache=cache))
+    if isinstance(file, rawfile.rawfile):
+        return path, 'raw', (file.noheader, marshal.dumps(rawcache.rawcache.pack(file.tokens())))
+    elif isinstance(file, binfile.binfile):
+        return path, 'bin', file.content
+    else:
+        return path, 'ref', None
+        
+def postfactory(result, root=None, dir=None):
+    '''Internal: Create a file object given a result returned by prefactory.'''
+    path, kind, data = result
+    if kind == 'raw':
+        file = rawfile.rawfile(path=path, root=root, dir=dir, readpath=False)
+        file.noheader, packed = data
+        file.settokens(rawcache.rawcache.unpack(marshal.loads(packed), file), setfile=False)
+        file.dirty = False
+        return file
+    elif kind == 'bin':
+        return binfile.binfile(path=path, root=root, dir=dir, content=data)
+    else:
+        return reffile.reffile(path=path, root=root, dir=dir)
+
+
+
+import dir
+import rawcache
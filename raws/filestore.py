@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import os
+import time
+import json
+import shutil
+import hashlib
+
+
+
+class filestore(object):
+    '''
+        Stores copies of files in a directory on disk, with each distinct
+        content stored only once under a hash of it. Each time files are
+        stored a manifest is written recording which content belongs at each
+        path, so any earlier set of files can be restored later. Files whose
+        size and modification time match the most recent manifest aren't read
+        again, so storing files which haven't changed costs next to nothing.
+    '''
+
+    # Read and hash files in chunks of this many bytes
+    chunksize = 1 << 20
+
+    def __init__(self, path):
+        '''Initialize a store given the directory where it keeps its files.'''
+        self.path = path
+        self.stored = 0   # Number of files whose content was new to the store
+        self.reused = 0   # Number of files whose content was already in the store
+
+    def __str__(self):
+        '''Get a string representation.'''
+        return '%s (%d stored, %d reused)' % (self.path, self.stored, self.reused)
+
+    def objectpath(self, hash):
+        '''Internal: Get the path where content with some hash is stored.'''
+        return os.path.join(self.path, 'objects', hash[:2], hash)
+
+    def manifestpath(self, name):
+        '''Internal: Get the path of the manifest with some name.'''
+        return os.path.join(self.path, 'manifests', '%s.json' % name)
+
+    def manifests(self):
+        '''Get the names of all manifests in the store, oldest first.'''
+        manifestdir = os.path.join(self.path, 'manifests')
+        if not os.path.isdir(manifestdir): return []
+        return sorted(os.path.splitext(name)[0] for name in os.listdir(manifestdir) if name.endswith('.json'))
+
+    def manifest(self, name=None):
+        '''
+            Get the manifest with some name, or the most recent one if no name
+            is given, as a dict mapping paths relative to the root the files
+            were stored from to their hash, size, and modified time. Returns
+            None when there is no such manifest.
+        '''
+        if name is None:
+            names = self.manifests()
+            if not names: return None
+            name = names[-1]
+        path = self.manifestpath(name)
+        if not os.path.isfile(path): return None
+        with open(path, 'rb') as manifest:
+            return json.load(manifest)['files']
+
+    def store(self, root, paths=None, name=None):
+        '''
+            Store files and directories at paths relative to a root directory,
+            or everything in the root if no paths are given, and write a
+            manifest for them. Returns the name of the manifest.
+        '''
+        root = os.path.abspath(root)
+        previous = self.manifest() or {}
+        files = {}
+        for path in (paths if paths is not None else os.listdir(root)):
+            path = os.path.join(root, path)
+            if os.path.isfile(path):
+                walk = ((os.path.dirname(path), (), (os.path.basename(path),)),)
+            elif os.path.isdir(path):
+                walk = os.walk(path)
+            else:
+                raise ValueError('Failed to store path %s because it refers to neither a file nor a directory.' % path)
+            for walkroot, walkdirs, walkfiles in walk:
+                for filename in walkfiles:
+                    filepath = os.path.join(walkroot, filename)
+                    relpath = os.path.relpath(filepath, root).replace('\\', '/')
+                    stat = os.stat(filepath)
+                    entry = previous.get(relpath)
+                    if entry is not None and entry[1] == stat.st_size and entry[2] == stat.st_mtime and os.path.isfile(self.objectpath(entry[0])):
+                        self.reused += 1
+                    else:
+                        entry = (self.add(filepath), stat.st_size, stat.st_mtime)
+                    files[relpath] = entry
+        if name is None: name = self.newname()
+        self.writemanifest(name, root, files)
+        return name
+
+    def add(self, path):
+        '''
+            Internal: Add the content of the file at some path to the store,
+            if it isn't already there, and return its hash.
+        '''
+        objectsdir = os.path.join(self.path, 'objects')
+        if not os.path.isdir(objectsdir): os.makedirs(objectsdir)
+        temppath = os.path.join(objectsdir, '%d.tmp' % os.getpid())
+        hash = hashlib.sha1()
+        try:
+            with open(path, 'rb') as src, open(temppath, 'wb') as dest:
+                for chunk in iter(lambda: src.read(filestore.chunksize), ''):
+                    hash.update(chunk)
+                    dest.write(chunk)
+            hash = hash.hexdigest()
+            objectpath = self.objectpath(hash)
+            if os.path.isfile(objectpath):
+                os.remove(temppath)
+                self.reused += 1
+            else:
+                if not os.path.isdir(os.path.dirname(objectpath)): os.makedirs(os.path.dirname(objectpath))
+                os.rename(temppath, objectpath)
+                self.stored += 1
+        except:
+            if os.path.isfile(temppath): os.remove(temppath)
+            raise
+        return hash
+
+    def newname(self):
+        '''Internal: Get a name for a new manifest which sorts after all existing ones.'''
+        name = time.strftime('%Y.%m.%d.%H.%M.%S')
+        names = self.manifests()
+        if names and names[-1] >= name:
+            # Names are only precise to the second, so count up for manifests made in the same second
+            base, _, count = names[-1].partition('+')
+            name = '%s+%03d' % (base, int(count or 0) + 1)
+        return name
+
+    def writemanifest(self, name, root, files):
+        '''Internal: Write a manifest given a dict of the files it records.'''
+        path = self.manifestpath(name)
+        if not os.path.isdir(os.path.dirname(path)): os.makedirs(os.path.dirname(path))
+        temppath = '%s.tmp' % path
+        with open(temppath, 'wb') as manifest:
+            json.dump({'root': root, 'files': files}, manifest, indent=0, sort_keys=True)
+        if os.path.isfile(path): os.remove(path)
+        os.rename(temppath, path)
+
+    def restore(self, dest, name=None):
+        '''
+            Restore the files recorded by the manifest with some name, or by
+            the most recent one if no name is given, to a destination directory.
+            Files already at the destination with the recorded size and
+            modified time are left alone. Files at the destination which the
+            manifest doesn't record are also left alone.
+        '''
+        files = self.manifest(name)
+        if files is None: raise ValueError('Failed to restore from store %s because it has no manifest named %s.' % (self.path, name))
+        for relpath, (hash, size, mtime) in files.iteritems():
+            destpath = os.path.join(dest, relpath)
+            if os.path.isfile(destpath):
+                stat = os.stat(destpath)
+                if stat.st_size == size and stat.st_mtime == mtime: continue
+            elif not os.path.isdir(os.path.dirname(destpath)):
+                os.makedirs(os.path.dirname(destpath))
+            temppath = '%s.tmp' % destpath
+            shutil.copyfile(self.objectpath(hash), temppath)
+            os.utime(temppath, (mtime, mtime))
+            if os.name == 'nt' and os.path.isfile(destpath): os.remove(destpath)
+            os.rename(temppath, destpath)
@@ -27,6 +27,55 @@ class basefilter(object):
         '''Internal: Should be overridden by inheriting classes.'''
         return False
         
+    def predicate(self):
+        '''
+            Get a function accepting a token which returns the same as the
+            match method would for that token. The function is specialized for
+            the filter's current attributes, so it shouldn't be kept around
+            after the filter has been modified.
+        '''
+        match = self.basepredicate()
+        return (lambda token: not match(token)) if self.inv else match
+    def basepredicate(self):
+        '''Internal: May be overridden by inheriting classes to provide a faster predicate.'''
+        return self.basematch
+        
+    def evaluator(self):
+        '''
+            Get a function accepting a token and a count which returns the same
+            as the eval method would for them. Queries use this instead of
+            calling the filter for each token.
+        '''
+        match = self.predicate()
+        limit = self.limit
+        if limit is None: return lambda token, count: (match(token), False)
+        terminates = self.limit_terminates
+        def evaluate(token, count):
+            matches = False
+            if count < limit:
+                matches = match(token)
+                if matches: count += 1
+            return matches, terminates and count >= limit
+        return evaluate
+    
+    @staticmethod
+    def conjunction(predicates):
+        '''Internal: Get a predicate which matches when every one of some predicates matches.'''
+        if not predicates:
+            return lambda token: True
+        elif len(predicates) == 1:
+            return predicates[0]
+        elif len(predicates) == 2:
+            first, second = predicates
+            return lambda token: first(token) and second(token)
+        else:
+            predicates = tuple(predicates)
+            def matchall(token):
+                for predicate in predicates:
+                    if not predicate(token): return False
+                return True
+            return matchall
+        
     def copy(self):
         '''Make a copy of the filter.'''
         return copy.deepcopy(self)
@@ -173,8 +222,8 @@ class tokenfilter(basefilter):
             exact_args = tokenargs.tokenargs(exact_args)
             
         self.exact_token = exact_token
-        self.exact_value = exact_value
-        self.except_value = except_value
+        self.exact_value = symboltable.symboltable.value(exact_value)
+        self.except_value = symboltable.symboltable.value(except_value)
         self.exact_args = exact_args
         self.exact_arg = exact_arg
         self.exact_prefix = exact_prefix
@@ -238,29 +287,29 @@ class tokenfilter(basefilter):
             (self.value_in is not None and token.value not in self.value_in) or
             (self.value_not_in is not None and token.value in self.value_not_in) or
             (self.re_value is not None and re.match(self.re_value, token.value) == None) or
-            (self.args_contains is not None and str(self.args_contains) not in [str(a) for a in token.args])
+            (self.args_contains is not None and str(self.args_contains) not in [str(a) for a in token.arglist])
         ):
             return False
             
         if self.exact_args is not None:
-            if not (len(self.exact_args) == token.nargs() and all([self.exact_args[i] == None or str(self.exact_args[i]) == token.args[i] for i in xrange(0, token.nargs())])):
+            if not (len(self.exact_args) == token.nargs() and all([self.exact_args[i] == None or str(self.exact_args[i]) == token.arglist[i] for i in xrange(0, token.nargs())])):
                 return False
         if self.re_args is not None:
-            if not (len(self.re_args) == token.nargs() and all([self.re_args[i] == None or re.match(self.re_args[i], token.args[i]) for i in xrange(0, token.nargs())])):
+            if not (len(self.re_args) == token.nargs() and all([self.re_args[i] == None or re.match(self.re_args[i], token.arglist[i]) for i in xrange(0, token.nargs())])):
                 return False
                 
         try:
             if self.exact_arg is not None:
-                if not all([token.args[a[0]] == str(a[1]) for a in self.exact_arg]):
+                if not all([token.arglist[a[0]] == str(a[1]) for a in self.exact_arg]):
                     return False
             if self.arg_in is not None:
-                if not all([token.args[a[0]] in a[1] for a in self.arg_in]):
+                if not all([token.arglist[a[0]] in a[1] for a in self.arg_in]):
                     return False
             if self.arg_not_in is not None:
-                if any([token.args[a[0]] in a[1] for a in self.arg_not_in]):
+                if any([token.arglist[a[0]] in a[1] for a in self.arg_not_in]):
                     return False
             if self.re_arg is not None:
-                if not all([re.match(a[1], token.args[a[0]]) for a in self.re_arg]):
+                if not all([re.match(a[1], token.arglist[a[0]]) for a in self.re_arg]):
                     return False
         except IndexError: # Specified index is out of range of the arguments list
             return False
@@ -277,6 +326,129 @@ class tokenfilter(basefilter):
                 return False
         return True
         
+    def basepredicate(self):
+        '''Internal: Get a predicate performing only those checks which apply to this filter.'''
+        return basefilter.conjunction(self.checks())
+        
+    def checks(self):
+        '''
+            Internal: Get a list of predicates which must all match for the
+            filter to match, each one corresponding to an attribute which isn't
+            None. Containers are converted to frozensets and regular expressions
+            are compiled ahead of time.
+        '''
+        checks = []
+        
+        if self.exact_token is not None:
+            exact_token = self.exact_token
+            checks.append(lambda token: token is exact_token)
+        if self.except_value is not None:
+            except_value = self.except_value
+            checks.append(lambda token: token.value != except_value)
+        if self.exact_value is not None:
+            exact_value = self.exact_value
+            checks.append(lambda token: token.value == exact_value)
+        if self.args_count is not None:
+            args_count = self.args_count
+            checks.append(lambda token: len(token.arglist) == args_count)
+        if self.value_in is not None:
+            value_in = tokenfilter.container(self.value_in)
+            checks.append(lambda token: token.value in value_in)
+        if self.value_not_in is not None:
+            value_not_in = tokenfilter.container(self.value_not_in)
+            checks.append(lambda token: token.value not in value_not_in)
+        if self.re_value is not None:
+            re_value = re.compile(self.re_value).match
+            checks.append(lambda token: re_value(token.value) is not None)
+        if self.args_contains is not None:
+            args_contains = str(self.args_contains)
+            checks.append(lambda token: args_contains in token.arglist)
+            
+        if self.exact_args is not None:
+            exact_args = tuple(None if arg is None else str(arg) for arg in self.exact_args)
+            if None not in exact_args:
+                checks.append(lambda token: token.arglist == exact_args)
+            else:
+                count = len(exact_args)
+                pairs = tuple((index, arg) for index, arg in enumerate(exact_args) if arg is not None)
+                checks.append(lambda token: len(token.arglist) == count and all(token.arglist[index] == arg for index, arg in pairs))
+        if self.re_args is not None:
+            count = len(self.re_args)
+            pairs = tuple((index, re.compile(arg).match) for index, arg in enumerate(self.re_args) if arg is not None)
+            checks.append(lambda token: len(token.arglist) == count and all(match(token.arglist[index]) for index, match in pairs))
+            
+        if self.exact_arg is not None:
+            pairs = tuple((index, str(arg)) for index, arg in self.exact_arg)
+            checks.append(tokenfilter.indexcheck(lambda args: all(args[index] == arg for index, arg in pairs)))
+        if self.arg_in is not None:
+            pairs = tuple((index, tokenfilter.container(container)) for index, container in self.arg_in)
+            checks.append(tokenfilter.indexcheck(lambda args: all(args[index] in container for index, container in pairs)))
+        if self.arg_not_in is not None:
+            pairs = tuple((index, tokenfilter.container(container)) for index, container in self.arg_not_in)
+            checks.append(tokenfilter.indexcheck(lambda args: not any(args[index] in container for index, container in pairs)))
+        if self.re_arg is not None:
+            pairs = tuple((index, re.compile(arg).match) for index, arg in self.re_arg)
+            checks.append(tokenfilter.indexcheck(lambda args: all(match(args[index]) for index, match in pairs)))
+            
+        if self.exact_prefix is not None or self.re_prefix is not None:
+            exact_prefix = self.exact_prefix
+            re_prefix = None if self.re_prefix is None else re.compile(self.re_prefix).match
+            def prefixcheck(token):
+                match_prefix = '' if token.prefix is None else str(token.prefix)
+                if token.prev is not None and token.prev.suffix is not None: match_prefix = token.prev.suffix + match_prefix
+                return not ((exact_prefix is not None and match_prefix != exact_prefix) or (re_prefix is not None and re_prefix(match_prefix) is None))
+            checks.append(prefixcheck)
+        if self.exact_suffix is not None or self.re_suffix is not None:
+            exact_suffix = self.exact_suffix
+            re_suffix = None if self.re_suffix is None else re.compile(self.re_suffix).match
+            def suffixcheck(token):
+                match_suffix = '' if token.suffix is None else str(token.suffix)
+                if token.next is not None and token.next.prefix is not None: match_suffix = match_suffix + token.next.prefix
+                return not ((exact_suffix is not None and match_suffix != exact_suffix) or (re_suffix is not None and re_suffix(match_suffix) is None))
+            checks.append(suffixcheck)
+            
+        return checks
+        
+    def values(self):
+        '''
+            Internal: Get a frozenset of values, one of which a token must have
+            in order to match the filter, or None if the filter doesn't limit
+            tokens to particular values. Used to plan queries.
+        '''
+        if self.inv:
+            return None
+        elif self.exact_value is not None:
+            return frozenset((self.exact_value,))
+        elif self.value_in is not None and not isinstance(self.value_in, basestring):
+            try:
+                return frozenset(self.value_in)
+            except TypeError:
+                return None
+        else:
+            return None
+        
+    @staticmethod
+    def container(items):
+        '''Internal: Get a frozenset with the same items as some container, when possible.'''
+        if isinstance(items, (basestring, frozenset)): return items
+        try:
+            return frozenset(items)
+        except TypeError:
+            return items
+            
+    @staticmethod
+    def indexcheck(check):
+        '''
+            Internal: Wrap a function checking a token's arguments by index so
+            that indexes out of range cause the token not to match.
+        '''
+        def checkargs(token):
+            try:
+                return check(token.arglist)
+            except IndexError:
+                return False
+        return checkargs
+        
     def __str__(self):
         '''Get a string representation.'''
         parts = []
@@ -316,6 +488,52 @@ class boolfilter(basefilter):
                 if not sub.match(token): return False
             return True
         return False
+        
+    def basepredicate(self):
+        '''
+            Internal: Get a predicate combining those of the subordinate filters.
+            Nested conjunctions and disjunctions are flattened into one, and the
+            checks of uninverted tokenfilters are included in conjunctions
+            directly.
+        '''
+        if self.operand == 'all':
+            return basefilter.conjunction(self.flatten('all'))
+        elif self.operand == 'any':
+            predicates = tuple(self.flatten('any'))
+            if len(predicates) == 1: return predicates[0]
+            def matchany(token):
+                for predicate in predicates:
+                    if predicate(token): return True
+                return False
+            return matchany
+        elif self.operand == 'one':
+            predicates = tuple(boolfilter.subpredicate(sub) for sub in self.subs)
+            def matchone(token):
+                count = 0
+                for predicate in predicates:
+                    count += bool(predicate(token))
+                    if count > 1: return False
+                return count == 1
+            return matchone
+        else:
+            return lambda token: False
+            
+    def flatten(self, operand):
+        '''Internal: Get a list of predicates for the subordinates of a conjunction or disjunction.'''
+        predicates = []
+        for sub in self.subs:
+            if isinstance(sub, boolfilter) and sub.operand == operand and not sub.inv:
+                predicates.extend(sub.flatten(operand))
+            elif operand == 'all' and isinstance(sub, tokenfilter) and not sub.inv:
+                predicates.extend(sub.checks())
+            else:
+                predicates.append(boolfilter.subpredicate(sub))
+        return predicates
+        
+    @staticmethod
+    def subpredicate(sub):
+        '''Internal: Get a predicate for a subordinate filter.'''
+        return sub.predicate() if isinstance(sub, basefilter) else sub.match
             
     @staticmethod
     def one(*subs):
@@ -342,3 +560,4 @@ class boolfilter(basefilter):
 
 import tokenparse
 import tokenargs
+import symboltable
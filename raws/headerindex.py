@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+
+
+class headerindex(object):
+    '''
+        Internal: Records which files in a dir begin with an OBJECT token for
+        each header, like [OBJECT:CREATURE], so that the files containing some
+        type of object can be found without looking at the first token of
+        every file. A file is looked at again only after it's added to the dir
+        or after its tokens change, which the file reports to its dir.
+    '''
+
+    def __init__(self, dir):
+        '''Build an index of the files belonging to a dir.'''
+        self.dir = dir
+        self.byheader = {}  # Maps headers to dicts mapping ids of files beginning with that header to the files
+        self.headers = {}   # Maps ids of files to the headers they were last found to begin with
+        self.stale = {}     # Maps ids of files which need to be looked at again to the files
+        self.ordered = {}   # Maps tuples of headers to lists of their files in the dir's order, built when needed
+        for file in dir.iterfiles(): self.add(file)
+
+    def add(self, file):
+        '''Internal: Called when a file is added to the dir or its tokens change.'''
+        if isinstance(file, queryable.queryable): self.stale[id(file)] = file
+
+    def remove(self, file):
+        '''Internal: Called when a file is removed from the dir.'''
+        self.stale.pop(id(file), None)
+        header = self.headers.pop(id(file), None)
+        if header is not None:
+            del self.byheader[header][id(file)]
+            self.ordered.clear()
+
+    def reordered(self):
+        '''
+            Internal: Called when files are added to or removed from the dir,
+            which can change the order in which the dir's files dict iterates.
+        '''
+        self.ordered.clear()
+
+    def refresh(self):
+        '''Internal: Look again at the first tokens of files which changed.'''
+        stale, self.stale = self.stale, {}
+        for file in stale.itervalues():
+            file.headerstale = False
+            if self.dir.pathindex.key(file) is None: continue # The file says it belongs to the dir but hasn't been added yet
+            root = file.peekroot()
+            header = root.arglist[0] if root is not None and root.value == 'OBJECT' and len(root.arglist) == 1 else None
+            if header != self.headers.get(id(file)):
+                self.remove(file)
+                if header is not None:
+                    self.byheader.setdefault(header, {})[id(file)] = file
+                    self.headers[id(file)] = header
+                    self.ordered.clear()
+
+    def files(self, headers):
+        '''
+            Get the files beginning with any of some headers, in the same order
+            as the dir's files dict.
+        '''
+        if self.stale: self.refresh()
+        headers = tuple(headers)
+        files = self.ordered.get(headers)
+        if files is None:
+            wanted = set(id(file) for header in headers for file in self.byheader.get(header, {}).itervalues())
+            files = [file for file in self.dir.files.itervalues() if id(file) in wanted] if wanted else []
+            self.ordered[headers] = files
+        return files
+
+
+import queryable
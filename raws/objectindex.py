@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+
+
+class objectindex(object):
+    '''
+        Internal: Records where object tokens, meaning tokens like
+        [CREATURE:DWARF] having an object type for a value and exactly one
+        argument, appear in a file so that they can be found without checking
+        every token. Files keep one of these and build a new one only when an
+        object token has been added, removed, or changed since the last.
+        
+        The index also records the span of each object's properties. Because
+        properties can be added to or removed from the start or end of a span
+        without rebuilding the index, spans are recorded as the token which
+        follows the last property, which is always the next object token
+        belonging to the file's header, instead of as a first and last
+        property token.
+    '''
+
+    def __init__(self, header, generation=None):
+        '''Build an index of the object tokens following a header token.'''
+        self.header = header
+        self.generation = generation
+        self.tokens = [] # Indexed tokens in the order they appear
+        self.bytype = {} # Maps types to positions in self.tokens
+        self.byid = {}   # Maps (type, id) tuples to positions in self.tokens
+        self.ends = None # Maps ids of indexed tokens to the tokens ending their spans
+        indexed = objects.indexed
+        position = 0
+        token = header.next if header is not None else None
+        while token is not None:
+            if token.value in indexed and len(token.arglist) == 1:
+                self.tokens.append(token)
+                self.bytype.setdefault(token.value, []).append(position)
+                self.byid.setdefault((token.value, token.arglist[0]), []).append(position)
+                position += 1
+            token = token.next
+
+    def positions(self, type=None, exact_id=None, type_in=None, id_in=None):
+        '''Get the sorted positions of indexed tokens matching the given type and id.'''
+        types = (type,) if type is not None else type_in
+        if exact_id:
+            exact_id = str(exact_id)
+            lists = [self.byid.get((itertype, exact_id)) for itertype in types]
+        elif id_in and len(id_in) < len(types):
+            lists = [self.byid.get((itertype, id)) for itertype in types for id in id_in]
+        else:
+            lists = [self.bytype.get(itertype) for itertype in types]
+        lists = [positions for positions in lists if positions]
+        if len(lists) == 1:
+            positions = lists[0]
+        else:
+            positions = sorted(set(position for positions in lists for position in positions))
+        return [
+            position for position in positions if (
+                (type is None or type_in is None or self.tokens[position].value in type_in) and
+                (id_in is None or self.tokens[position].arglist[0] in id_in)
+            )
+        ]
+
+    def propend(self, token):
+        '''
+            Get the token following the last property of an indexed token, or
+            None if its properties continue to the end of the file. Raises a
+            KeyError if the token isn't in the index.
+        '''
+        if self.ends is None:
+            terminators = objects.objectsforheader(self.header)
+            ends = {}
+            end = None
+            for objecttoken in reversed(self.tokens):
+                ends[id(objecttoken)] = end
+                if objecttoken.value in terminators: end = objecttoken
+            self.ends = ends
+        return self.ends[id(token)]
+
+    def get(self, *args, **kwargs):
+        '''Get the first indexed token matching the given type and id.'''
+        positions = self.positions(*args, **kwargs)
+        return self.tokens[positions[0]] if positions else None
+
+    def last(self, *args, **kwargs):
+        '''Get the last indexed token matching the given type and id.'''
+        positions = self.positions(*args, **kwargs)
+        return self.tokens[positions[-1]] if positions else None
+
+    def all(self, *args, **kwargs):
+        '''Get all indexed tokens matching the given type and id.'''
+        return [self.tokens[position] for position in self.positions(*args, **kwargs)]
+
+
+
+import objects
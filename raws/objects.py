@@ -104,6 +104,9 @@ headers_31.update(headers_base)
 objects_23 = objectsdict(headers_23)
 objects_31 = objectsdict(headers_31)
 
+# Values of tokens which can affect object indexes, for any version
+indexed = frozenset(objects_23.keys() + objects_31.keys() + ['OBJECT'])
+
 
 
 def headers(version=None):
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import collections
+
+
+
+class orderindex(object):
+    '''
+        Internal: Records the order of the tokens in a file so that tokens can
+        be retrieved by index and their order compared without walking the
+        file. Each token is given a label, and labels increase through the
+        file with gaps left between them. Tokens added to the file afterwards
+        are labelled using the gap between their neighbours, so comparisons
+        stay cheap while the file is being modified, and the file is only
+        labelled again from the start when a gap runs out. Positions are
+        derived from labels, and so are known only until a token is added or
+        removed.
+    '''
+
+    spacing = 1 << 32    # Gap between the labels of neighbouring tokens when labelling the whole file
+    minspacing = 1 << 16 # Smallest gap left between labels when labelling tokens added since
+
+    def __init__(self, file):
+        '''Build an index of the tokens in a file.'''
+        self.file = file
+        self.build()
+
+    def build(self):
+        '''Internal: Label every token in the file from the start.'''
+        self.labels = {}      # Maps ids of tokens to their labels
+        self.tokens = []      # All tokens in the order they appear, or None if tokens were added or removed since
+        self.added = []       # Tokens added since they were last labelled
+        token = self.file.root()
+        while token is not None:
+            self.labels[id(token)] = len(self.tokens) * orderindex.spacing
+            self.tokens.append(token)
+            token = token.next
+
+    def __len__(self):
+        '''Get the number of tokens in the file.'''
+        return len(self.positions())
+
+    def add(self, token):
+        '''Internal: Called when a token is added to the file.'''
+        if self.labels is not None:
+            self.tokens = None
+            self.added.append(token)
+            # Rather than hold on to a long list of additions, label everything again later
+            if len(self.added) > len(self.labels): self.labels = None
+
+    def remove(self, token):
+        '''Internal: Called when a token is removed from the file.'''
+        if self.labels is not None:
+            self.tokens = None
+            self.labels.pop(id(token), None)
+
+    def current(self):
+        '''Get whether the positions of tokens are known without walking the file.'''
+        return self.tokens is not None
+
+    def positions(self):
+        '''Internal: Get the list of tokens in order, walking the file if it's changed.'''
+        if self.tokens is None: self.build()
+        return self.tokens
+
+    def index(self, index):
+        '''Get the token at an index, or None if the index is out of range.'''
+        tokens = self.positions()
+        if -len(tokens) <= index < len(tokens):
+            return tokens[index]
+        else:
+            return None
+
+    def position(self, token):
+        '''Get the position of a token, or None if it isn't in the index.'''
+        tokens = self.positions()
+        label = self.labels.get(id(token))
+        position = label // orderindex.spacing if label is not None else None
+        return position if position is not None and tokens[position] is token else None
+
+    def label(self, token):
+        '''
+            Internal: Get the label of a token in the file, first labelling
+            tokens which were added since the last time.
+        '''
+        if self.labels is None: self.build()
+        if self.added:
+            added, self.added = self.added, []
+            for addedtoken in added:
+                if addedtoken.file is self.file and id(addedtoken) not in self.labels:
+                    if not self.fill(addedtoken):
+                        self.build()
+                        break
+        return self.labels.get(id(token))
+
+    def fill(self, token):
+        '''
+            Internal: Label a token which was added to the file, along with any
+            other unlabelled tokens adjacent to it. When there isn't enough of
+            a gap between the neighbouring labels, labelled tokens on either
+            side are labelled again as well, and the number of them doubles
+            until there's room. Returns False if the file has no labelled
+            tokens to start from.
+        '''
+        labels = self.labels
+        run = collections.deque((token,))
+        first, last = token.prev, token.next
+        widen = 0
+        while True:
+            count = widen
+            while first is not None and (count or id(first) not in labels):
+                run.appendleft(first)
+                first = first.prev
+                if count: count -= 1
+            count = widen
+            while last is not None and (count or id(last) not in labels):
+                run.append(last)
+                last = last.next
+                if count: count -= 1
+            low = labels[id(first)] if first is not None else None
+            high = labels[id(last)] if last is not None else None
+            if low is None and high is None:
+                return False
+            elif low is None:
+                step = orderindex.spacing
+                low = high - step * (len(run) + 1)
+            elif high is None:
+                step = orderindex.spacing
+            else:
+                step = (high - low) // (len(run) + 1)
+            if step >= orderindex.minspacing:
+                for i, runtoken in enumerate(run):
+                    labels[id(runtoken)] = low + step * (i + 1)
+                return True
+            widen = len(run)
+        
+    def follows(self, token, other):
+        '''Get whether a token is located after another one in the file.'''
+        label, otherlabel = self.label(token), self.label(other)
+        return label is not None and otherlabel is not None and label > otherlabel
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import fnmatch
+
+
+
+class pathtrie(object):
+    '''
+        Internal: Indexes the files in a dir by the directories in their
+        paths, so that the files under some directory, or with paths matching
+        a glob pattern, can be found by looking only at the directories along
+        the way rather than at every file in the dir. The key each file was
+        added under is remembered so that it isn't computed again, and so
+        that the file can be found by it even if the file has been renamed.
+    '''
+
+    def __init__(self):
+        '''Initialize an empty trie.'''
+        self.root = ({}, {}) # Each node is a dict of subdirectory nodes and a dict of files, both by name
+        self.keys = {}       # Maps ids of files to the keys they were added under
+
+    def __len__(self):
+        '''Get the number of files in the trie.'''
+        return len(self.keys)
+
+    def key(self, file):
+        '''Get the key a file was added under, or None if it wasn't.'''
+        return self.keys.get(id(file))
+
+    def add(self, key, file):
+        '''Add a file with a key, which is its path with parts separated by slashes.'''
+        parts = key.split('/')
+        node = self.root
+        for part in parts[:-1]:
+            child = node[0].get(part)
+            if child is None:
+                child = ({}, {})
+                node[0][part] = child
+            node = child
+        node[1][parts[-1]] = file
+        self.keys[id(file)] = key
+
+    def remove(self, file):
+        '''Remove a file from the trie, and return the key it was added under.'''
+        key = self.keys.pop(id(file), None)
+        if key is not None:
+            parts = key.split('/')
+            nodes = [self.root]
+            for part in parts[:-1]:
+                nodes.append(nodes[-1][0][part])
+            nodes[-1][1].pop(parts[-1], None)
+            # Get rid of directories left without anything in them
+            for index in xrange(len(parts) - 1, 0, -1):
+                if nodes[index][0] or nodes[index][1]: break
+                del nodes[index - 1][0][parts[index - 1]]
+        return key
+
+    def clear(self):
+        '''Remove all files from the trie.'''
+        self.root = ({}, {})
+        self.keys = {}
+
+    def node(self, path):
+        '''Internal: Get the node for a directory, or None if there isn't one.'''
+        node = self.root
+        if path:
+            for part in path.split('/'):
+                node = node[0].get(part)
+                if node is None: return None
+        return node
+
+    def under(self, path):
+        '''Iterate through the keys and files located anywhere under a directory.'''
+        node = self.node(path)
+        if node is not None:
+            stack = [(path + '/' if path else '', node)]
+            while stack:
+                prefix, node = stack.pop()
+                for name, file in node[1].iteritems():
+                    yield prefix + name, file
+                for name, child in node[0].iteritems():
+                    stack.append((prefix + name + '/', child))
+
+    def glob(self, pattern):
+        '''
+            Iterate through the keys and files matching a glob pattern. Each
+            part of the pattern is matched against one part of a path, except
+            that a part which is just ** matches any number of directories.
+        '''
+        parts = pattern.split('/')
+        if parts[-1] == '**': parts.append('*')
+        stack = [(0, '', self.root)]
+        while stack:
+            index, prefix, node = stack.pop()
+            part = parts[index]
+            last = index == len(parts) - 1
+            if part == '**':
+                for name, child in node[0].iteritems():
+                    stack.append((index, prefix + name + '/', child))
+                stack.append((index + 1, prefix, node))
+            elif last:
+                for name in self.matches(part, node[1]):
+                    yield prefix + name, node[1][name]
+            else:
+                for name in self.matches(part, node[0]):
+                    stack.append((index + 1, prefix + name + '/', node[0][name]))
+
+    @staticmethod
+    def matches(part, names):
+        '''Internal: Get the names in a dict which match one part of a glob pattern.'''
+        if any(char in part for char in '*?['):
+            return fnmatch.filter(names.iterkeys(), part)
+        else:
+            return (part,) if part in names else ()
@@ -191,6 +191,8 @@ class queryable(object):
             if auto is not None:
                 pretty = auto
             
+            plan = tokens is None and prefilters is None and postfilters is None and filters is None
+            
             tokens, conditionargs, untilargs = self.argstokens(tokens, kwargs)
             
             if iter is None:
@@ -219,6 +221,9 @@ class queryable(object):
                 if callable(postfilters): postfilters = (postfilters,)
                 queryfilters = queryfilters + postfilters    
             
+            if plan and not (until or untilargs) and len(queryfilters) == 1 and len(conditionargs) == len(kwargs):
+                tokens = self.plantokens(queryfilters[0], tokens)
+            
             result = self.query(
                 filters = queryfilters,
                 tokens = tokens, 
@@ -256,27 +261,74 @@ class queryable(object):
         querymethod.__name__ = queryname
         return querymethod
         
+    @staticmethod
+    def cached(method):
+        '''
+            Internal: Decorates a query method so that its results are kept in
+            the cache given by the querycache method, when there is one, and
+            reused until the tokens being queried change.
+        '''
+        name = method.__name__
+        def cachedmethod(self, *args, **kwargs):
+            cache = self.querycache()
+            if cache is None: return method(self, *args, **kwargs)
+            return cache.query(self, name, method, args, kwargs)
+        cachedmethod.__name__ = name
+        cachedmethod.__doc__ = method.__doc__
+        return cachedmethod
+        
+    def querycache(self):
+        '''
+            Internal: Inheriting classes which count the changes made to their
+            tokens may override this to get a querycache object for keeping
+            the results of their queries. None means results aren't kept.
+        '''
+        return None
+        
+    def plantokens(self, filter, tokens):
+        '''
+            Internal: Used by convenience query methods to pick the tokens to
+            be checked by a query with only one filter. When the filter only
+            matches tokens with certain values and this object keeps an index
+            of its tokens' values, only the tokens having those values are
+            checked. Otherwise, all of the tokens are checked.
+        '''
+        values = filter.values() if isinstance(filter, filters.tokenfilter) else None
+        if values is not None:
+            indexed = self.valuetokens(values)
+            if indexed is not None: return indexed
+        return tokens
+        
+    def valuetokens(self, values):
+        '''
+            Internal: Inheriting classes which keep an index of their tokens'
+            values may override this to get, in the same order as itokens, the
+            tokens having any of a set of values. None means there's no index.
+        '''
+        return None
+        
     def argstokens(self, tokens, kwargs):
         '''
             Internal: Utility function for separating arguments to pass on to a
             tokens iterator from arguments to pass to filters.
         '''
         
-        conditionargs = kwargs
+        conditionargs = {}
         untilargs = {}
+        tokensargs = {}
         tokens = tokens
         
+        possibletokensargs = ('range', 'reverse', 'until', 'step', 'skip') if tokens is None else () # inspect.getargspec(self.itokens)[0]
+        for argname, argvalue in kwargs.iteritems():
+            if argname in possibletokensargs:
+                tokensargs[argname] = argvalue
+            elif argname.startswith('until_'):
+                untilargs[argname[6:]] = argvalue
+            else:
+                conditionargs[argname] = argvalue
+        
         if tokens is None:
             if hasattr(self, 'tokens') and callable(self.itokens):
-                conditionargs, tokensargs = {}, {}
-                possibletokensargs = ('range', 'reverse', 'until', 'step', 'skip') # inspect.getargspec(self.itokens)[0]
-                for argname, argvalue in kwargs.iteritems():
-                    if argname in possibletokensargs:
-                        tokensargs[argname] = argvalue
-                    elif argname.startswith('until_'):
-                        untilargs[argname[6:]] = argvalue
-                    else:
-                        conditionargs[argname] = argvalue
                 tokens = self.tokens(**tokensargs)
             else:
                 raise ValueError('Failed to understand query arguments because no tokens iterator could be found or constructed.')
@@ -333,6 +385,7 @@ class queryable(object):
             results = [tokenlist.tokenlist() for i in filters]
             filteriter = tuple(enumerate(filters))
             resultcontainer = queryresult.queryresult(self, results)
+        filteriter = queryable.evaluators(filteriter)
         
         limit = False    
         for token in tokens:
@@ -367,6 +420,7 @@ class queryable(object):
             count = [0 for i in filters]
             filteriter = tuple(enumerate(filters))
             newresult = lambda: [None for i in filters]
+        filteriter = queryable.evaluators(filteriter)
             
         limit = False
         for token in tokens:
@@ -389,6 +443,135 @@ class queryable(object):
             yield result
             if limit: break
             
+    def batch(self, queries, tokens=None, **kwargs):
+        '''
+            Run several independent queries in a single pass through the
+            tokens, rather than one pass apiece, and get a dict mapping the
+            name of each query to its result. Queries are given as a dict
+            mapping names to queries, where each query is a dict of the
+            arguments that the get, last, or all methods accept plus a 'method'
+            item naming which of them the query behaves like, defaulting to
+            'all'. Each query stops by itself when its limit is reached or its
+            until token is found, and the pass ends early once every query has
+            stopped. A query may also be just a pretty string or a filter, in
+            which case it behaves like all. Other keyword arguments, such as
+            reverse, decide which tokens are looked at like they do for the
+            other query methods. For example:
+            
+            results = df.batch({
+                'dwarf': {'method': 'get', 'pretty': 'CREATURE:DWARF'},
+                'metals': {'exact_value': 'INORGANIC', 'limit': 10},
+                'lastplant': {'method': 'last', 'exact_value': 'PLANT'},
+            })
+        '''
+        
+        plan = tokens is None and not kwargs
+        tokens, conditionargs, untilargs = self.argstokens(tokens, kwargs)
+        if conditionargs or untilargs:
+            raise ValueError('Failed to run batch query because of unrecognized arguments %s.' % ', '.join(conditionargs.keys() + untilargs.keys()))
+        
+        results = {}
+        active = []
+        values = set()
+        for name, query in queries.iteritems():
+            method, filter, untilfilter = queryable.batchfilters(query)
+            results[name] = tokenlist.tokenlist() if method == 'all' else None
+            active.append([name, method, queryable.batchevaluator(filter), queryable.batchevaluator(untilfilter), 0])
+            for checkfilter in (filter, untilfilter):
+                if values is not None and checkfilter is not None:
+                    filtervalues = checkfilter.values() if isinstance(checkfilter, filters.tokenfilter) else None
+                    values = values.union(filtervalues) if filtervalues is not None else None
+        
+        # When every query only matches tokens with certain values, only look at tokens having those values
+        if plan and values:
+            indexed = self.valuetokens(values)
+            if indexed is not None: tokens = indexed
+        
+        for token in tokens:
+            if not active: break
+            stopped = False
+            for query in active:
+                name, method, evaluate, until, count = query
+                if until is not None and until(token, 0)[1]:
+                    query[2] = None
+                    stopped = True
+                    continue
+                matches, terminate = evaluate(token, count)
+                if matches:
+                    query[4] += 1
+                    if method == 'all':
+                        results[name].append(token)
+                    else:
+                        results[name] = token
+                if terminate:
+                    query[2] = None
+                    stopped = True
+            if stopped: active = [query for query in active if query[2] is not None]
+            
+        return results
+        
+    @staticmethod
+    def batchfilters(query):
+        '''
+            Internal: Used by batch to get the method of a query along with the
+            filter which its results must match and the filter which stops it,
+            if any, in the same way as the get, last, and all methods do.
+        '''
+        if isinstance(query, basestring):
+            query = {'pretty': query}
+        elif not isinstance(query, dict):
+            return 'all', query, None
+        query = dict(query)
+        method = query.pop('method', 'all')
+        if method not in queryable.builders:
+            raise ValueError('Failed to run batch query because the method %s isn\'t one of %s.' % (method, ', '.join(queryable.builders)))
+        pretty = query.pop('pretty', None)
+        until = query.pop('until', None)
+        conditionargs, untilargs = {}, {}
+        for argname, argvalue in query.iteritems():
+            if argname.startswith('until_'):
+                untilargs[argname[6:]] = argvalue
+            else:
+                conditionargs[argname] = argvalue
+        if method == 'get': conditionargs['limit'] = 1
+        if pretty or conditionargs:
+            filter = filters.tokenfilter(pretty=pretty, **conditionargs)
+        else:
+            filter = lambda token, count: (True, False)
+        untilfilter = filters.tokenfilter(pretty=until, limit=1, **untilargs) if until or untilargs else None
+        return method, filter, untilfilter
+        
+    @staticmethod
+    def batchevaluator(filter):
+        '''
+            Internal: Used by batch to get a function accepting a token and
+            a count which returns whether the token matches a filter and
+            whether the query should stop, however the filter reports those.
+        '''
+        if filter is None or isinstance(filter, filters.basefilter):
+            return filter.evaluator() if filter is not None else None
+        def evaluate(token, count):
+            try:
+                returned = filter(token, count)
+            except TypeError:
+                returned = filter(token)
+            try:
+                matches, terminate = returned
+            except:
+                matches, terminate = returned, False
+            return matches, terminate
+        return evaluate
+        
+    @staticmethod
+    def evaluators(filteriter):
+        '''
+            Internal: Used by lquery and iquery to replace filter objects with
+            functions specialized for evaluating them.
+        '''
+        return tuple(
+            (key, filter.evaluator() if isinstance(filter, filters.basefilter) else filter) for key, filter in filteriter
+        )
+            
     def tokens(self, *args, **kwargs):
         '''Get tokens as a tokengenerator.'''
         return tokengenerator.tokengenerator(self.itokens, *args, **kwargs)
@@ -26,14 +26,45 @@ class queryableaddprop(queryableadd.queryableadd, queryableprop.queryableprop):
     }
     
     def addprop(self, *args, **kwargs):
-        beforevalues, aftervalues = (
-            queryableaddprop.add_props_before_after.get(
-                self.value, queryableaddprop.add_props_before_after_default
-            )
+        addafter = self.propanchor()
+        file = self.file
+        if file is None or kwargs.get('reverse') or kwargs.get('knit'):
+            addafter.add(*args, **kwargs)
+        else:
+            index, generation = file.anchindex(), file.generation
+            added = addafter.add(*args, **kwargs)
+            # The anchor stays known unless the added tokens changed where objects begin and end
+            if added is not None and file.cachedanchindex is index and file.generation == generation:
+                beforevalues, aftervalues = self.propbeforeafter()
+                index.generation = file.tokengeneration
+                index.set(self, anchorindex.anchorindex.advance(
+                    addafter, (added,) if isinstance(added, token.token) else added, beforevalues, aftervalues
+                ))
+        
+    def propanchor(self):
+        '''
+            Internal: Get the token which addprop adds new properties after.
+            That's the last of the object's properties which ought to come
+            before those added, or the object token itself if there is none.
+        '''
+        file = self.file
+        index = file.anchindex() if file is not None else None
+        addafter = index.get(self) if index is not None else None
+        if addafter is None:
+            beforevalues, aftervalues = self.propbeforeafter()
+            addafter = self.lastprop(value_in=aftervalues, until_value_in=beforevalues)
+            if addafter is None: addafter = self
+            if index is not None: index.set(self, addafter)
+        return addafter
+        
+    def propbeforeafter(self):
+        '''
+            Internal: Get the values of properties which addprop adds new
+            properties before and after, for this type of object.
+        '''
+        return queryableaddprop.add_props_before_after.get(
+            self.value, queryableaddprop.add_props_before_after_default
         )
-        addafter = self.lastprop(value_in=aftervalues, until_value_in=beforevalues)
-        if addafter is None: addafter = self
-        addafter.add(*args, **kwargs)
             
     def setprop(self, *args, **kwargs):
         self.setsingular(self.getprop, self.addprop, *args, **kwargs)
@@ -43,3 +74,8 @@ class queryableaddprop(queryableadd.queryableadd, queryableprop.queryableprop):
         
     def setallprop(self, *args, **kwargs):
         self.setplural(self.allprop, *args, **kwargs)
+
+
+
+import token
+import anchorindex
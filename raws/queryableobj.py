@@ -22,9 +22,12 @@ class queryableobj(queryable.queryable):
         else:
             headers = []
         if type_in:
+            added = set(id(header) for header in headers)
             for itertype in type_in: 
                 for header in self.getobjheaders(itertype):
-                    if not any(header is h for h in headers): headers.append(header)
+                    if id(header) not in added:
+                        added.add(id(header))
+                        headers.append(header)
         return headers
         
     def removeobj(self, *args, **kwargs):
@@ -32,16 +35,44 @@ class queryableobj(queryable.queryable):
         if obj: obj.removeselfandprops()
         return obj
     def removeallobj(self, *args, **kwargs):
+        '''
+            Remove all objects matching some filter along with their
+            properties, and get the removed object tokens. The properties of
+            every object are found up front using their files' object indexes,
+            and then each object is unlinked along with its properties in a
+            single splice. The removed tokens of each object stay linked to
+            each other.
+        '''
         objects = self.allobj(*args, **kwargs)
-        for obj in objects: obj.removeselfandprops()
+        spans = {} # Maps ids of files to the files and the first and last tokens of the objects to remove from them
+        for obj in objects:
+            file = obj.file
+            try:
+                end = file.objindex().propend(obj) if file is not None and file.getobjheaders() else obj
+            except KeyError:
+                end = obj
+            if end is obj:
+                # The object's properties aren't known without querying for them
+                obj.removeselfandprops()
+            else:
+                last = end.prev if end is not None else file.tail()
+                spans.setdefault(id(file), (file, []))[1].append((obj, last))
+        for file, filespans in spans.itervalues():
+            file.removespans(filespans)
         return objects
         
+    @queryable.queryable.cached
     def getobj(self, pretty=None, type=None, exact_id=None, type_in=None, re_id=None, id_in=None, **kwargs):
         '''Get the first object token matching a given type and id.'''
             
         type, exact_id = queryableobj.objpretty(pretty, type, exact_id)
         headers = self.headersfortype(type, type_in)
         if type is None and type_in is None: type_in = objects.objects()
+        if re_id is None and not kwargs:
+            for objecttoken in headers:
+                obj = queryableobj.objindex(objecttoken).get(type, exact_id, type_in, id_in or None)
+                if obj: return obj
+            return None
         for objecttoken in headers:
             obj = objecttoken.get(
                 exact_value = type,
@@ -55,12 +86,18 @@ class queryableobj(queryable.queryable):
             if obj: return obj
         return None
         
+    @queryable.queryable.cached
     def lastobj(self, pretty=None, type=None, exact_id=None, type_in=None, re_id=None, id_in=None, **kwargs): 
         '''Get the last object token matching a given type and id.'''
         
         type, exact_id = queryableobj.objpretty(pretty, type, exact_id)
         headers = self.headersfortype(type, type_in)
         if type is None and type_in is None: type_in = objects.objects()
+        if re_id is None and not kwargs:
+            for objecttoken in headers:
+                obj = queryableobj.objindex(objecttoken).last(type, exact_id, type_in, id_in or None)
+                if obj: return obj
+            return None
         for objecttoken in headers:
             obj = objecttoken.last(
                 exact_value = type,
@@ -74,6 +111,7 @@ class queryableobj(queryable.queryable):
             if obj: return obj
         return None
         
+    @queryable.queryable.cached
     def allobj(self, pretty=None, type=None, exact_id=None, type_in=None, re_id=None, id_in=None, **kwargs):
         '''Get all object tokens matching a given type and id.'''
         
@@ -81,6 +119,10 @@ class queryableobj(queryable.queryable):
         results = tokenlist.tokenlist()
         headers = self.headersfortype(type, type_in)
         if type is None and type_in is None: type_in = objects.objects()
+        if re_id is None and not kwargs:
+            for objecttoken in headers:
+                results.extend(queryableobj.objindex(objecttoken).all(type, exact_id, type_in, id_in or None))
+            return results
         for objecttoken in headers:
             for result in objecttoken.all(
                 exact_value = type,
@@ -102,6 +144,17 @@ class queryableobj(queryable.queryable):
         '''
         return {token.args[0]: token for token in self.allobj(*args, **kwargs)}
         
+    @staticmethod
+    def objindex(header):
+        '''
+            Internal: Get an index of the object tokens following a header
+            token, usually the one kept by the file the header belongs to.
+        '''
+        if header.file is not None and header.file.root() is header:
+            return header.file.objindex()
+        else:
+            return objectindex.objectindex(header)
+        
     @staticmethod
     def objpretty(pretty, type, id):
         '''Internal: Used for handling getobj/allobj arguments.'''
@@ -120,4 +173,5 @@ class queryableobj(queryable.queryable):
 
 
 import objects
+import objectindex
 import tokenlist
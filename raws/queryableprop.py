@@ -9,22 +9,50 @@ class queryableprop(queryable.queryable):
     
     # Inheriting classes must implement a propterminationfilter method
     
+    @queryable.queryable.cached
     def getprop(self, *args, **kwargs):
         '''Get the first matching property belonging to an object.'''
         return self.propquery(self.get, *args, **kwargs)
     
+    @queryable.queryable.cached
     def lastprop(self, *args, **kwargs):
         '''Get the last matching property belonging to an object.'''
         return self.propquery(self.last, *args, **kwargs)
     
+    @queryable.queryable.cached
     def allprop(self, *args, **kwargs):
         '''Get all matching properties belonging to an object.'''
         return self.propquery(self.all, *args, **kwargs)
         
+    def propdict(self, *args, **kwargs):
+        '''
+            Calls allprop with the same arguments then adds each result to a
+            dictionary associating property values with lists of the tokens
+            having those values, in the order they appear.
+        '''
+        props = {}
+        for token in self.allprop(*args, **kwargs):
+            props.setdefault(token.value, tokenlist.tokenlist()).append(token)
+        return props
+        
+    # Prop queries given any of these arguments can't use the propspan method
+    propspanexclusive = ('tokens', 'range', 'reverse', 'step', 'skip')
+    
     def propquery(self, method, *args, **kwargs):
         '''Internal: Generalized prop query.'''
+        if len(args) <= 3 and not any(key in kwargs for key in queryableprop.propspanexclusive):
+            tokens = self.propspan()
+            if tokens is not None: return method(*args, tokens=tokens, **kwargs)
         return method(*args, prefilters=self.propterminationfilter(), **kwargs)
         
+    def propspan(self):
+        '''
+            Internal: Inheriting classes may override this method to return
+            the tokens which are properties of an object, when they can be
+            found faster than by using propterminationfilter.
+        '''
+        return None
+        
     def removeprop(self, *args, **kwargs):
         '''Remove the first property matching some filter.'''
         token = self.getprop(*args, **kwargs)
@@ -40,3 +68,7 @@ class queryableprop(queryable.queryable):
         tokens = self.allprop(*args, **kwargs)
         for token in tokens: token.remove()
         return tokens
+
+
+
+import tokenlist
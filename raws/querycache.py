@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import threading
+from collections import OrderedDict
+
+
+
+class querycache(object):
+    '''
+        Keeps the results of recent queries made on a dir or on a raws file,
+        including prop queries made on the object tokens in a file, so that
+        asking the same question again before anything has changed doesn't
+        look through the tokens again. Dirs and files count the changes made
+        to their tokens, and results are only reused while the count is the
+        same as when they were found. Only queries given plain arguments like
+        strings and tuples of strings are cached, since others might depend
+        on more than the tokens being queried. The least recently used results
+        are discarded when there are too many.
+    '''
+
+    enabled = True  # Set to False to stop using cached results everywhere, for example while debugging
+    size = 256      # Maximum number of results kept by each cache
+
+    # Types of argument values which can be part of a cache key
+    plaintypes = (basestring, int, long, float, bool, type(None))
+
+    def __init__(self, owner):
+        '''Initialize an empty cache for a dir or file.'''
+        self.owner = owner          # The dir or file whose querygeneration attribute counts changes
+        self.enabled = True         # Set to False to stop using cached results for just this dir or file
+        self.results = OrderedDict() # Maps keys to tuples of generation, queried object, and result
+        self.hits = 0               # Number of queries answered using a cached result
+        self.misses = 0             # Number of cacheable queries which had to be run
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        '''Get the number of results in the cache.'''
+        return len(self.results)
+
+    def __str__(self):
+        return '%d results, %d hits, %d misses' % (len(self.results), self.hits, self.misses)
+
+    def clear(self):
+        '''Remove all results from the cache and reset its counters.'''
+        with self.lock:
+            self.results.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def query(self, target, name, method, args, kwargs):
+        '''
+            Internal: Get the result of calling a query method of some object
+            with some arguments, using a cached result where possible.
+        '''
+        key = querycache.key(target, name, args, kwargs) if self.enabled and querycache.enabled else None
+        if key is None: return method(target, *args, **kwargs)
+        generation = self.owner.querygeneration
+        with self.lock:
+            entry = self.results.pop(key, None)
+            if entry is not None and entry[0] == generation and entry[1] is target:
+                self.results[key] = entry
+                self.hits += 1
+                return querycache.copy(entry[2])
+            self.misses += 1
+        result = method(target, *args, **kwargs)
+        # Don't keep the result if the query itself changed anything, like by parsing a lazily read file
+        if self.owner.querygeneration == generation:
+            with self.lock:
+                self.results[key] = (generation, target, result)
+                while len(self.results) > querycache.size: self.results.popitem(last=False)
+        return querycache.copy(result)
+
+    @staticmethod
+    def key(target, name, args, kwargs):
+        '''
+            Internal: Get the key for a query, or None if its arguments aren't
+            all plain values, or if it returns an iterator.
+        '''
+        if kwargs.get('iter'): return None
+        try:
+            return (id(target), name, querycache.plain(args), querycache.plain(sorted(kwargs.iteritems())))
+        except TypeError:
+            return None
+
+    @staticmethod
+    def plain(value):
+        '''
+            Internal: Get a hashable equivalent of an argument value, or raise
+            a TypeError if it isn't a plain value or a collection of them.
+        '''
+        if isinstance(value, querycache.plaintypes):
+            return value
+        elif isinstance(value, (tuple, list)):
+            return tuple(querycache.plain(item) for item in value)
+        elif isinstance(value, (set, frozenset)):
+            return frozenset(querycache.plain(item) for item in value)
+        else:
+            raise TypeError('Failed to use value of type %s as part of a query cache key.' % type(value))
+
+    @staticmethod
+    def copy(result):
+        '''Internal: Get a result so that changing it doesn't change the cached one.'''
+        if isinstance(result, tokenlist.tokenlist):
+            copy = tokenlist.tokenlist()
+            copy.content = list(result.content)
+            return copy
+        else:
+            return result
+
+
+
+import tokenlist
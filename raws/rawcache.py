@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import os
+import marshal
+import hashlib
+import itertools
+
+
+
+class rawcache(object):
+    '''
+        Stores the parsed contents of raws files in a directory on disk so that
+        files which haven't changed since they were last read don't need to be
+        tokenized again. Each file gets its own cache entry, keyed by its path,
+        size, modification time, and a hash of its content. The content is
+        only read and hashed when the other parts of the key already match,
+        and then it doesn't need to be tokenized.
+    '''
+
+    # Increment this when the format of cache entries changes
+    format = 3
+
+    def __init__(self, path):
+        '''Initialize a cache object given the directory where entries are stored.'''
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+
+    def __str__(self):
+        '''Get a string representation.'''
+        return '%s (%d hits, %d misses)' % (self.path, self.hits, self.misses)
+
+    def entrypath(self, path):
+        '''Internal: Get the path of the cache entry for a file path.'''
+        return os.path.join(self.path, '%s.cache' % hashlib.md5(os.path.abspath(path)).hexdigest())
+
+    @staticmethod
+    def key(path):
+        '''
+            Internal: Get the part of the key identifying a particular version
+            of a file which can be found without reading it.
+        '''
+        stat = os.stat(path)
+        return (rawcache.format, os.path.abspath(path), stat.st_size, stat.st_mtime)
+        
+    @staticmethod
+    def hash(content):
+        '''Internal: Get the part of the key identifying a file by its content.'''
+        return hashlib.md5(content).digest()
+
+    def load(self, path, file=None):
+        '''
+            Get the header line and tokens of the file at some path as a tuple,
+            or None if the cache has no valid entry for that file.
+        '''
+        try:
+            with open(self.entrypath(path), 'rb') as entry:
+                if marshal.load(entry) != rawcache.key(path):
+                    self.misses += 1
+                    return None
+                # The content can change without changing the size or the modification time
+                hash = marshal.load(entry)
+                with open(path, 'rb') as src:
+                    if rawcache.hash(src.read()) != hash:
+                        self.misses += 1
+                        return None
+                header = marshal.load(entry)
+                packed = marshal.load(entry)
+        except (IOError, OSError, EOFError, ValueError, TypeError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return header, rawcache.unpack(packed, file)
+
+    def store(self, path, header, tokens, content):
+        '''
+            Store the header line and tokens parsed from the file at some path,
+            given the content they were parsed from.
+        '''
+        if not os.path.isdir(self.path): os.makedirs(self.path)
+        entrypath = self.entrypath(path)
+        temppath = '%s.tmp' % entrypath
+        with open(temppath, 'wb') as entry:
+            marshal.dump(rawcache.key(path), entry)
+            marshal.dump(rawcache.hash(content), entry)
+            marshal.dump(header, entry)
+            marshal.dump(rawcache.pack(tokens), entry)
+        if os.path.isfile(entrypath): os.remove(entrypath)
+        os.rename(temppath, entrypath)
+
+    def clear(self):
+        '''Remove all entries from the cache.'''
+        if os.path.isdir(self.path):
+            for name in os.listdir(self.path):
+                if name.endswith('.cache'): os.remove(os.path.join(self.path, name))
+
+    @staticmethod
+    def pack(tokens):
+        '''
+            Get a compact representation of a sequence of tokens made only of
+            lists and strings, suitable for marshalling. Each distinct value
+            and arguments pair is stored once, and tokens refer to it by index.
+        '''
+        prefixes, keys, table = [], [], []
+        indexes = {}
+        suffix = None
+        for token in tokens:
+            prefixes.append(token.prefix)
+            index = indexes.get((token.value, token.arglist))
+            if index is None:
+                index = indexes[(token.value, token.arglist)] = len(table)
+                table.append([token.value] + list(token.arglist))
+            keys.append(index)
+            suffix = token.suffix
+        return (prefixes, keys, table, suffix)
+
+    @staticmethod
+    def unpack(packed, file=None):
+        '''
+            Get a tokenlist from the representation created by pack. The tokens
+            are assumed to have been legal when they were packed and so they
+            aren't verified again. When the file belongs to a dir, values and
+            arguments are canonicalized using the dir's symbol table, once for
+            each distinct pair rather than once for each token.
+        '''
+        tokens = tokenlist.tokenlist()
+        unpacked = tokens.content
+        create = token.token.unchecked
+        setnext = object.__setattr__
+        symbols = file.dir.symbols if file is not None and file.dir is not None else None
+        internvalue = symboltable.symboltable.value if symbols is not None else str
+        internargs = symbols.args if symbols is not None else tuple
+        prev = None
+        prefixes, keys, table, suffix = packed
+        entries = [(internvalue(entry[0]), internargs(entry[1:])) for entry in table]
+        for prefix, key in itertools.izip(prefixes, keys):
+            value, args = entries[key]
+            unpackedtoken = create(value, args, prefix, prev, file)
+            if prev is not None: setnext(prev, 'next', unpackedtoken)
+            unpacked.append(unpackedtoken)
+            prev = unpackedtoken
+        if prev is not None and suffix is not None: setnext(prev, 'suffix', suffix)
+        return tokens
+
+
+
+import token
+import tokenlist
+import symboltable
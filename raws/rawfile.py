@@ -2,6 +2,7 @@
 # coding: utf-8
 
 import os
+import weakref
 
 import contentfile
 import queryableobj
@@ -12,6 +13,21 @@ import queryableadd
 class rawfile(queryableobj.queryableobj, queryableadd.queryableadd, contentfile.contentfile):
     '''Represents a single raws file within a dir object.'''
     
+    generation = 0        # Incremented whenever an object token in the file changes
+    tokengeneration = 0   # Incremented whenever any token is added, removed, or given a new value
+    cachedobjindex = None # Most recently built index of object tokens in the file
+    cachedvalindex = None # Most recently built index of token values in the file
+    cachedordindex = None # Index of the order of tokens in the file, kept up to date as tokens are added and removed
+    cachedanchindex = None # Most recently started index of where addprop adds properties to objects in the file
+    cachedquerycache = None # Results of recent queries on the file and its object tokens, made when needed
+    querygeneration = 0   # Incremented whenever anything about the file's tokens changes
+    count = None          # Number of tokens in the file, or None if they need counting
+    source = None         # File whose tokens this copy shares until they're needed
+    copies = None         # Maps ids to copies of this file made since it was last modified
+    buffersize = 1 << 16  # Size of the buffer used when writing the file's content
+    dirty = True          # False while the tokens are unmodified since being read from the file's path
+    headerstale = False   # True when the first token may have changed since the dir's header index looked at it
+    
     def __init__(self, name=None, file=None, path=None, root=None, content=None, tokens=None, dir=None, readpath=True, noheader=False, **kwargs):
         '''Constructs a new raws file object.'''
         
@@ -22,6 +38,10 @@ class rawfile(queryableobj.queryableobj, queryableadd.queryableadd, contentfile.
         
         self.roottoken = None
         self.tailtoken = None
+        self.count = 0
+        
+        self.lazy = False       # True when the file's content hasn't been parsed yet
+        self.peeked = None      # A lone copy of the file's first token, when lazy
         
         if content is not None or tokens is not None:
             readpath = False
@@ -66,10 +86,11 @@ class rawfile(queryableobj.queryableobj, queryableadd.queryableadd, contentfile.
         
     def getcontent(self, short=False):
         '''Get the textual content of the file.'''
+        tokens = (self if self.source is None else self.source).tokens()
         if short:
-            tokencontent = ''.join(token.shortstr() for token in self.tokens())
+            tokencontent = ''.join(token.shortstr() for token in tokens)
         else:
-            tokencontent = ''.join(token.fullstr() for token in self.tokens())
+            tokencontent = ''.join(token.fullstr() for token in tokens)
         if self.noheader:
             return tokencontent
         else:
@@ -79,12 +100,53 @@ class rawfile(queryableobj.queryableobj, queryableadd.queryableadd, contentfile.
         '''Set the file content via a string.'''
         self.read(content=content)
         
+    def write(self, file):
+        '''
+            Write the file contents to a path or file-like object. Files which
+            haven't been modified since they were read, including those loaded
+            lazily and never parsed, are written by copying the bytes of the
+            file they were read from, or not at all if the destination is
+            already a copy of that file.
+        '''
+        if self.unmodified():
+            if file is None or isinstance(file, basestring):
+                dest = self.dest(file, makedir=True)
+                if not self.uptodate(dest): self.writestaged(dest, self.copyto)
+            else:
+                with open(self.path, 'rb') as src:
+                    file.write(src.read())
+        else:
+            contentfile.contentfile.write(self, file)
+            
+    def writeto(self, file):
+        '''
+            Internal: Write the file contents to a file path or file-like
+            object a token at a time, without building the whole string.
+        '''
+        if isinstance(file, basestring):
+            with open(file, 'wb', rawfile.buffersize) as out:
+                self.writeto(out)
+        else:
+            if not self.noheader: file.write('%s\n' % self.name)
+            file.writelines(token.fullstr() for token in (self if self.source is None else self.source).tokens())
+            
+    def unmodified(self):
+        '''
+            Internal: Get whether writing the file would reproduce the file it
+            was read from.
+        '''
+        return bool(self.path) and (self.lazy or not self.dirty) and (
+            self.noheader or self.name == os.path.splitext(os.path.basename(self.path))[0]
+        )
+            
     def ref(self, **kwargs):
         raise ValueError('Failed to cast rawfile %s to reffile because it is an invalid conversion.' % self)
     def bin(self, **kwargs):
         self.kind = 'bin'
+        content = self.getcontent()
+        self.release()
         self.__class__ =  binfile.binfile
-        self.content = self.getcontent()
+        self.content = content
         for key, value in kwargs.iteritems(): self.__dict__[key] = value
         return self
     def raw(self, **kwargs):
@@ -93,19 +155,123 @@ class rawfile(queryableobj.queryableobj, queryableadd.queryableadd, contentfile.
     
     def index(self, index):
         '''Get the token at an integer index.'''
-        itrtoken = self.root() if index >= 0 else self.tail()
-        index += (index < 0)
-        for i in xrange(0, abs(index)):
-            itrtoken = itrtoken.next if index > 0 else itrtoken.prev
-            if itrtoken is None: return None
-        return itrtoken
+        return self.ordindex().index(index)
         
     def settokens(self, tokens, setfile=True):
         '''Internal: Set the root and tail tokens given an iterable.'''
+        self.changed()
+        self.cachedordindex = None
         self.roottoken, self.tailtoken = helpers.ends(tokens, self if setfile else None)
+        self.count = None
+        
+    def changed(self, objects=True, count=0, added=None, removed=None):
+        '''
+            Internal: Called when tokens are added to or removed from the file,
+            or when their values change. When objects is True the change may
+            also affect the file's object index. The count argument is the
+            change in the number of tokens belonging to the file, and added
+            and removed are the token being added or removed, if any.
+        '''
+        self.touch()
+        self.tokengeneration += 1
+        if objects: self.generation += 1
+        if count and self.count is not None: self.count += count
+        if self.cachedordindex is not None:
+            if removed is not None: self.cachedordindex.remove(removed)
+            if added is not None: self.cachedordindex.add(added)
+        if not self.headerstale and self.dir is not None:
+            self.headerstale = True
+            self.dir.filechanged(self)
+        
+    def touch(self):
+        '''
+            Internal: Called before any of the file's tokens are modified. The
+            file is marked as dirty, and copies which are still sharing its
+            tokens or which haven't yet parsed its path get tokens of their
+            own. Copies are marked as dirty too, since the file they would
+            otherwise be written from may be about to change.
+        '''
+        self.dirty = True
+        self.querygeneration += 1
+        if self.dir is not None: self.dir.querygeneration += 1
+        if self.copies:
+            copies, self.copies = self.copies.values(), None
+            for copy in copies:
+                if isinstance(copy, rawfile):
+                    copy.parse()
+                    copy.dirty = True
+            
+    def release(self):
+        '''Internal: Stop sharing tokens with the file this one was copied from.'''
+        if self.source is not None:
+            self.source = None
+            self.peeked = None
+        
+    def objindex(self):
+        '''
+            Internal: Get an index of the object tokens in this file, building
+            a new one if the file has changed since the last was built.
+        '''
+        root = self.root()
+        if self.cachedobjindex is None or self.cachedobjindex.generation != self.generation:
+            self.cachedobjindex = objectindex.objectindex(root, self.generation)
+        return self.cachedobjindex
+        
+    def valindex(self):
+        '''
+            Internal: Get an index of the values of tokens in this file,
+            building a new one if the file has changed since the last was built.
+        '''
+        root = self.root()
+        if self.cachedvalindex is None or self.cachedvalindex.generation != self.tokengeneration:
+            self.cachedvalindex = valueindex.valueindex(root, self.tokengeneration)
+        return self.cachedvalindex
+        
+    def ordindex(self):
+        '''
+            Internal: Get an index of the order of tokens in this file. Unlike
+            the other indexes it isn't built again every time the file changes,
+            but is told about each token added to or removed from the file.
+        '''
+        if self.cachedordindex is None:
+            self.cachedordindex = orderindex.orderindex(self)
+        return self.cachedordindex
+        
+    def querycache(self):
+        '''Internal: Get the cache for results of queries on this file and its object tokens.'''
+        if self.cachedquerycache is None:
+            self.cachedquerycache = querycache.querycache(self)
+        return self.cachedquerycache
+        
+    def anchindex(self):
+        '''
+            Internal: Get an index of where addprop adds properties to objects
+            in this file, starting a new one if the file has changed since the
+            last was started.
+        '''
+        if self.cachedanchindex is None or self.cachedanchindex.generation != self.tokengeneration:
+            self.cachedanchindex = anchorindex.anchorindex(self.tokengeneration)
+        return self.cachedanchindex
+        
+    def position(self, token):
+        '''
+            Internal: Get the position of a token in this file, or None if the
+            token doesn't belong to it.
+        '''
+        return self.ordindex().position(token) if token.file is self else None
+        
+    def valuetokens(self, values):
+        '''Internal: Get the file's tokens having any of a set of values, in order.'''
+        return self.valindex().tokens(values)
     
     def copy(self):
-        '''Make a copy of a file and its contents.'''
+        '''
+            Make a copy of a file and its contents. The copy shares this file's
+            tokens until either file is modified or the copy's tokens are
+            accessed, and only then are the tokens actually copied. A copy of
+            a file which was loaded lazily and not yet parsed is also lazy, and
+            it's parsed before the original is modified.
+        '''
         copy = rawfile()
         copy.path = self.path
         copy.rootpath = self.rootpath
@@ -113,15 +279,52 @@ class rawfile(queryableobj.queryableobj, queryableadd.queryableadd, contentfile.
         copy.ext = self.ext
         copy.loc = self.loc
         copy.noheader = self.noheader
-        copy.settokens(helpers.icopytokens(self.tokens()))
+        source = self if self.source is None else self.source
+        if source.copies is None: source.copies = weakref.WeakValueDictionary()
+        source.copies[id(copy)] = copy
+        if self.lazy:
+            copy.lazy = True
+            copy.peeked = self.peeked
+        else:
+            root = source.root()
+            copy.source = source
+            copy.peeked = root.copy() if root is not None else None
+            copy.count = None
+            copy.dirty = self.dirty
         return copy
         
+    def parse(self):
+        '''
+            Parse the file's content now if it was loaded lazily, or copy the
+            tokens now if the file is a copy which is still sharing them.
+        '''
+        if self.source is not None:
+            source, dirty = self.source, self.dirty
+            self.release()
+            self.settokens(helpers.icopytokens(source.tokens()))
+            self.dirty = dirty
+        elif self.lazy:
+            # Parsing doesn't change the tokens, so copies don't need their own yet
+            copies, self.copies = self.copies, None
+            self.read(self.path, lazy=False)
+            self.copies = copies
+        
+    def peekroot(self):
+        '''
+            Get the first token in the file without parsing the rest of it if
+            it was loaded lazily. In that case the token returned isn't linked
+            to any others and changes made to it won't be reflected in the file.
+        '''
+        return self.peeked if self.lazy or self.source is not None else self.root()
+        
     def root(self):
         '''Get the first token in the file.'''
+        if self.lazy or self.source is not None: self.parse()
         while self.roottoken is not None and self.roottoken.prev is not None: self.roottoken = self.roottoken.prev
         return self.roottoken
     def tail(self):
         '''Get the last token in the file.'''
+        if self.lazy or self.source is not None: self.parse()
         while self.tailtoken is not None and self.tailtoken.next is not None: self.tailtoken = self.tailtoken.next
         return self.tailtoken
         
@@ -138,17 +341,47 @@ class rawfile(queryableobj.queryableobj, queryableadd.queryableadd, contentfile.
         for token in generator:
             yield token
             
-    def read(self, file=None, content=None, **kwargs):
-        '''Given a path or file-like object, read name and data.'''
+    def read(self, file=None, content=None, lazy=None, **kwargs):
+        '''
+            Given a path or file-like object, read name and data. If lazy is
+            True, or if it's None and the file belongs to a dir which reads
+            lazily, then only the first token is parsed right away and the
+            rest of the file isn't parsed until its tokens are needed.
+        '''
+        self.changed()
+        self.cachedordindex = None
+        self.release()
+        frompath = content is None and bool(
+            file is None or isinstance(file, basestring) or (self.path and os.path.abspath(getattr(file, 'name', '')) == self.path)
+        )
+        self.dirty = not frompath
         self.roottoken = None
         self.tailtoken = None 
+        self.lazy = False
+        self.peeked = None
+        self.count = 0
+        
+        if lazy is None: lazy = self.dir is not None and self.dir.lazy
+        lazy = lazy and frompath # Unparsed content is read again from the path later
+        if isinstance(file, basestring):
+            self.path = file
+            self.ext = os.path.splitext(file)[1]
+        
+        # Cache entries are only valid for the content of the file at their path
+        cache = self.dir.cache if self.dir is not None and frompath and not lazy and self.path else None
+        cached = cache.load(self.path, file=self) if cache is not None else None
+        if cached is not None:
+            header, tokens = cached
+            if self.name and header != self.name: self.noheader = True
+            if tokens: self.roottoken, self.tailtoken = tokens[0], tokens[-1]
+            self.count = len(tokens)
+            self.dirty = False
+            return
         
         if file is None and content is None:
             with open(self.path, 'rb') as src:
                 content = src.read()
         elif isinstance(file, basestring):
-            self.path = file
-            self.ext = os.path.splitext(file)[1]
             with open(file, 'rb') as src:
                 content = src.read()
         else:
@@ -165,8 +398,20 @@ class rawfile(queryableobj.queryableobj, queryableadd.queryableadd, contentfile.
             header = header.strip()
             if self.name:
                 if header != self.name: self.noheader = True
+            if data and lazy and self.path:
+                openbrace = data.find('[')
+                closebrace = data.find(']', openbrace) if openbrace != -1 else -1
+                if closebrace != -1:
+                    self.lazy = True
+                    self.count = None
+                    self.peeked = tokenparse.parsebulk(data[:closebrace+1])[0]
+                    return
             if data:
-                self.settokens(tokenparse.parseplural(data, file=self))
+                tokens = tokenparse.parsebulk(data, file=self)
+                if cache is not None: cache.store(self.path, header, tokens, content)
+                if tokens: self.roottoken, self.tailtoken = tokens[0], tokens[-1]
+                self.count = len(tokens)
+                self.dirty = not frompath
         else:
             self.noheader = True
             self.data = None
@@ -179,9 +424,9 @@ class rawfile(queryableobj.queryableobj, queryableadd.queryableadd, contentfile.
         else:
             token, tokens = rawstoken.token.autovariable(*args, **kwargs)
             if token is not None:
+                token.file = self
                 self.roottoken = token
                 self.tailtoken = token
-                token.file = self
                 return token
             elif tokens is not None:
                 self.settokens(tokens)
@@ -189,18 +434,57 @@ class rawfile(queryableobj.queryableobj, queryableadd.queryableadd, contentfile.
         
     def length(self, *args, **kwargs):
         '''Get the number of tokens in the file.'''
-        return sum(1 for token in self.tokens(*args, **kwargs))
+        if args or kwargs:
+            return sum(1 for token in self.tokens(*args, **kwargs))
+        if self.source is not None:
+            return self.source.length()
+        root = self.root()
+        if self.count is None:
+            self.count = sum(1 for token in root.tokens(skip=False)) if root is not None else 0
+        return self.count
+        
+    def removespans(self, spans):
+        '''
+            Internal: Remove runs of tokens from the file, each given as its
+            first and last token. Each run is unlinked from the file all at
+            once, and the file is told about the change once for every run,
+            rather than once per token. The tokens in a run are left linked
+            to each other. Returns the number of tokens removed.
+        '''
+        self.touch()
+        ordindex = self.cachedordindex
+        removed = 0
+        for first, last in spans:
+            token = first
+            while True:
+                object.__setattr__(token, 'file', None)
+                if ordindex is not None: ordindex.remove(token)
+                removed += 1
+                if token is last: break
+                token = token.next
+            left, right = first.prev, last.next
+            if left is not None: left.next = right
+            if right is not None: right.prev = left
+            if left is None: self.roottoken = right
+            if right is None: self.tailtoken = left
+            first.prev = None
+            last.next = None
+        if removed: self.changed(True, -removed)
+        return removed
         
     def clear(self):
         '''Remove all tokens from this file.'''
         for token in self.tokens(): token.file = None
         self.roottoken = None
         self.tailtoken = None
+        self.count = 0
+        self.changed()
+        self.cachedordindex = None
         
     def getobjheaders(self, type=None):
         match_types = self.getobjheadername(type)
-        root = self.root()
-        return (root,) if root is not None and root.value == 'OBJECT' and root.nargs(1) and root.args[0] in match_types else tuple()
+        root = self.peekroot()
+        return (self.root(),) if root is not None and root.value == 'OBJECT' and root.nargs(1) and root.args[0] in match_types else tuple()
 
 
 
@@ -208,3 +492,8 @@ import token as rawstoken
 import tokenparse
 import binfile
 import helpers
+import objectindex
+import valueindex
+import orderindex
+import anchorindex
+import querycache
@@ -2,7 +2,6 @@
 # coding: utf-8
 
 import os
-import shutil
 
 import basefile
 
@@ -43,9 +42,12 @@ class reffile(basefile.basefile):
         dest = self.dest(path, makedir=True)
         if self.path != dest:
             if os.path.isfile(self.path):
-                shutil.copy2(self.path, dest)
+                if not self.uptodate(dest): self.writestaged(dest, self.copyto)
             elif os.path.isdir(self.path):
-                copytree.copytree(self.path, dest)
+                if self.dir is not None:
+                    self.dir.copier.copytree(self.path, dest)
+                else:
+                    copytree.copytree(self.path, dest)
             else:
                 raise ValueError('Failed to write file because its path %s refers to neither a file nor a directory.' % self.path)
 
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import os
+
+import reffile
+
+
+
+class reftree(reffile.reffile):
+    '''
+        Stands in for all of the files in a directory which a dir would only
+        ever represent as reffiles, so that the dir doesn't have to make an
+        object for each of them when nothing looks inside. It's written like
+        a reffile referring to the whole directory. When a file inside it is
+        requested, added, or removed, the dir replaces the tree with reffiles
+        for each of the files it contains.
+    '''
+
+    def __init__(self, path=None, dir=None, root=None, names=None, **kwargs):
+        '''Initialize a reftree object given the names of the files inside.'''
+        reffile.reffile.__init__(self, path=path, dir=dir, root=root, **kwargs)
+        self.names = names if names is not None else set() # Names, without extensions, of files and empty directories inside
+
+    def copy(self):
+        copy = reftree()
+        copy.path = self.path
+        copy.rootpath = self.rootpath
+        copy.name = self.name
+        copy.ext = self.ext
+        copy.loc = self.loc
+        copy.names = self.names
+        return copy
+
+    def contains(self, name):
+        '''
+            Internal: Get whether a file name or a path relative to the root
+            of the dir may refer to something inside this tree.
+        '''
+        return name in self.names or name.startswith('%s/' % self)
+
+    def within(self, path):
+        '''
+            Internal: Get whether this tree is located at or anywhere under a
+            path relative to the root of the dir.
+        '''
+        return not path or str(self) == path or str(self).startswith('%s/' % path)
+
+    def expand(self):
+        '''
+            Internal: Get reffiles for every file inside the tree, and for the
+            empty directories inside it, located where the tree is located.
+        '''
+        files = []
+        for walkroot, walkdirs, walkfiles in os.walk(self.path):
+            relroot = os.path.relpath(walkroot, self.path)
+            loc = str(self) if relroot == os.curdir else os.path.join(str(self), relroot).replace('\\', '/')
+            for name in walkfiles:
+                files.append(reffile.reffile(path=os.path.join(walkroot, name), root=self.rootpath, loc=loc))
+            if walkroot != self.path and not walkfiles and not walkdirs:
+                files.append(reffile.reffile(path=walkroot, root=self.rootpath, loc=os.path.dirname(loc)))
+        return files
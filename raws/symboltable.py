@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+
+
+class symboltable(object):
+    '''
+        Canonicalizes the strings and argument tuples of the tokens in a dir.
+        The same few token values and arguments are repeated many thousands of
+        times across the raws, so rather than keeping a separate copy of each,
+        tokens share one string object per distinct string and one tuple per
+        distinct sequence of arguments. Strings are interned in the
+        interpreter's own table so that they're also identical to interned
+        strings used elsewhere, like in query filters, and this allows
+        equality checks to succeed on identity alone. Argument tuples are
+        hash-consed in a table belonging to the dir.
+    '''
+
+    def __init__(self):
+        '''Initialize an empty symbol table.'''
+        self.argtuples = {}
+
+    def __len__(self):
+        '''Get the number of distinct argument tuples in the table.'''
+        return len(self.argtuples)
+
+    @staticmethod
+    def value(string):
+        '''Get the canonical object for a string.'''
+        return intern(string) if type(string) is str else string
+
+    @staticmethod
+    def strings(items):
+        '''Get a tuple containing the canonical objects for some strings.'''
+        return tuple([intern(item) if type(item) is str else item for item in items])
+
+    def args(self, items):
+        '''Get the canonical tuple for a sequence of argument strings.'''
+        key = tuple(items)
+        canonical = self.argtuples.get(key)
+        if canonical is None:
+            canonical = symboltable.strings(key)
+            self.argtuples[canonical] = canonical
+        return canonical
+
+    def clear(self):
+        '''Remove all argument tuples from the table.'''
+        self.argtuples.clear()
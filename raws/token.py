@@ -3,16 +3,27 @@
 
 import queryableaddprop
 import tokenargs
+import symboltable
 
 
 
 class token(queryableaddprop.queryableaddprop):
     
+    # Tokens are numerous, so they're kept compact by storing their attributes
+    # in slots so that no per-token dict ever gets allocated. Arguments are
+    # stored in a tuple, usually shared with other tokens having the same
+    # arguments, which is wrapped by a tokenargs object only when accessed via
+    # the args attribute.
+    __slots__ = ('value', 'arglist', 'prefix', 'suffix', 'prev', 'next', 'file')
+    
     illegal_internal_chars = tokenargs.tokenargs.illegal # TODO: make this better
     
     '''Don't allow these characters in a token's prefix or suffix.'''
     illegal_external_chars = '['
     
+    '''Tokens look this far away by walking instead of asking their file's index.'''
+    walklimit = 16
+    
     def __init__(self, auto=None, pretty=None, copy=None, value=None, args=None, arg=None, prefix=None, suffix=None, prev=None, next=None, file=None):
         '''Constructs a token object.'''
         
@@ -24,27 +35,29 @@ class token(queryableaddprop.queryableaddprop):
             else:
                 raise TypeError('Failed to recognize argument of type %s.' % str(type(auto)))
         
-        self.value = None
-        self.args = None
-        self.prefix = None
-        self.suffix = None
-        self.prev = None
-        self.next = None
-        self.file = None
+        setslot = object.__setattr__
+        setslot(self, 'value', None)
+        setslot(self, 'arglist', ())
+        setslot(self, 'prefix', None)
+        setslot(self, 'suffix', None)
+        setslot(self, 'prev', None)
+        setslot(self, 'next', None)
+        setslot(self, 'file', None)
         
         if pretty is not None:
             copy = tokenparse.parsesingular(pretty, apply=self)
             
         if copy is not None:
             value = copy.value
-            args = copy.args
+            args = None
+            setslot(self, 'arglist', copy.arglist)
             prefix = copy.prefix
             suffix = copy.suffix
             
         if arg is not None:
             args = [arg]
         
-        if self.args is None or args is not None: self.args = args
+        if args is not None: self.args = args
         if value is not None: self.setvalue(value)
         if prefix is not None: self.setprefix(prefix)
         if suffix is not None: self.setsuffix(suffix)
@@ -52,12 +65,26 @@ class token(queryableaddprop.queryableaddprop):
         if next is not None: self.next = next
         if file is not None: self.file = file
         
+    def __getstate__(self):
+        '''Support for copy and pickle, which can't handle slots by themselves.'''
+        return dict((name, getattr(self, name)) for name in rawstoken.__slots__)
+        
+    def __setstate__(self, state):
+        '''
+            Support for copy and pickle. Attributes are set directly because
+            the checks made by __setattr__ assume the others are already set.
+        '''
+        for name in rawstoken.__slots__:
+            object.__setattr__(self, name, state.get(name))
+        object.__setattr__(self, 'value', symboltable.symboltable.value(self.value))
+        object.__setattr__(self, 'arglist', symboltable.symboltable.strings(self.arglist or ()))
+        
     def __hash__(self):
         '''
             Not that this class is immutable, just means you'll need to be
             careful about when you're using token hashes.
         '''
-        return hash('%s:%s' % (self.value, self.args) if self.nargs() else self.value)
+        return hash('%s:%s' % (self.value, ':'.join(self.arglist)) if self.arglist else self.value)
     
     def __str__(self):
         '''Get a string representation.'''
@@ -130,7 +157,7 @@ class token(queryableaddprop.queryableaddprop):
     def __iter__(self):
         '''Yields the tokens value and then each of its arguments.'''
         yield self.value
-        for arg in self.args: yield arg
+        for arg in self.arglist: yield arg
     def __len__(self):
         '''Returns the number of arguments.'''
         return self.nargs()
@@ -154,16 +181,41 @@ class token(queryableaddprop.queryableaddprop):
     def __setattr__(self, name, value):
         '''Internal: Handles input sanitization for certain attributes.'''
         if name == 'args':
-            if 'args' not in self.__dict__ or self.args is None:
-                self.__dict__['args'] = tokenargs.tokenargs()
-            self.__dict__['args'].reset(value)
+            tokenargs.tokenargs.view(self).reset(value)
         else:
             if name == 'value':
                 self.verifyinternal(value)
+                value = symboltable.symboltable.value(value)
+                if self.file is not None:
+                    self.file.changed(value in objects.indexed or self.value in objects.indexed)
             elif name == 'prefix' or name == 'suffix':
                 self.verifyexternal(value)
+                if self.file is not None: self.file.touch()
+            elif name == 'file':
+                indexed = self.value in objects.indexed
+                count = 1 if self.file is not value else 0
+                if self.file is not None: self.file.changed(indexed, -count, removed=self)
+                if value is not None: value.changed(indexed, count, added=self)
             super(token, self).__setattr__(name, value)
         
+    @staticmethod
+    def unchecked(value, args, prefix=None, prev=None, file=None):
+        '''
+            Internal: Construct a token without verifying its attributes. Used
+            by tokenparse.parsebulk, which already knows that the strings it
+            passes are legal. The arguments must be given as a tuple.
+        '''
+        new = object.__new__(rawstoken)
+        setslot = object.__setattr__
+        setslot(new, 'value', value)
+        setslot(new, 'arglist', args)
+        setslot(new, 'prefix', prefix)
+        setslot(new, 'suffix', None)
+        setslot(new, 'prev', prev)
+        setslot(new, 'next', None)
+        setslot(new, 'file', file)
+        return new
+        
     @staticmethod
     def autosingular(auto=None, token=None, **kwargs):
         '''Internal: Convenience function for handling method arguments when exactly one token is expected.'''
@@ -198,7 +250,7 @@ class token(queryableaddprop.queryableaddprop):
             else:
                 tokens = auto
         if pretty is not None:
-            parsed = tokenparse.parsevariable(pretty, implicit=implicit)
+            parsed = tokentemplate.tokentemplate.get(pretty, implicit=implicit).variable()
             if isinstance(parsed, rawstoken):
                 token = parsed
             else:
@@ -226,8 +278,8 @@ class token(queryableaddprop.queryableaddprop):
         
     def shortstr(self):
         '''Get a shortened string representation with only value and arguments.'''
-        if self.args:
-            return '[%s:%s]' % (self.value, self.args)
+        if self.arglist:
+            return '[%s:%s]' % (self.value, ':'.join(self.arglist))
         else:
             return '[%s]' % self.value
     
@@ -245,6 +297,12 @@ class token(queryableaddprop.queryableaddprop):
         
     def index(self, index):
         '''Return the token at an integer offset relative to this one.'''
+        # Walk short distances, and use the file's index for long ones
+        if self.file is not None and abs(index) > token.walklimit:
+            position = self.file.position(self)
+            if position is not None:
+                position += index
+                return self.file.index(position) if position >= 0 else None
         itrtoken = self
         for i in xrange(0, abs(index)):
             itrtoken = itrtoken.next if index > 0 else itrtoken.prev
@@ -256,6 +314,8 @@ class token(queryableaddprop.queryableaddprop):
             Return True if a particular token is located after this one in some
             file or list.
         '''
+        if other is not None and self.file is not None and self.file is other.file:
+            return self.file.ordindex().follows(self, other)
         if other is not None:
             for token in other.tokens():
                 if token is self:
@@ -272,7 +332,7 @@ class token(queryableaddprop.queryableaddprop):
             Otherwise, returns True if the number of arguments is equal to the
             given count and False if not.
         '''
-        return len(self.args) if (count is None) else (len(self.args) == count)
+        return len(self.arglist) if (count is None) else (len(self.arglist) == count)
 
     def setargs(self, args=None):
         '''Set the token's arguments.'''
@@ -280,7 +340,27 @@ class token(queryableaddprop.queryableaddprop):
         
     def getargs(self):
         '''Get the token's arguments.'''
-        return self.args
+        return tokenargs.tokenargs.view(self)
+        
+    args = property(getargs, setargs)
+    
+    def setarglist(self, items):
+        '''
+            Internal: Replace the token's tuple of arguments given a sequence
+            of strings which are already known to be legal.
+        '''
+        if self.file is not None:
+            if self.value in objects.indexed:
+                self.file.changed()
+            else:
+                self.file.touch()
+        symbols = self.symbols()
+        object.__setattr__(self, 'arglist', symboltable.symboltable.strings(items) if symbols is None else symbols.args(items))
+        
+    def symbols(self):
+        '''Internal: Get the symbol table of the dir this token belongs to, or None if there isn't one.'''
+        dir = self.file.dir if self.file is not None else None
+        return dir.symbols if dir is not None else None
         
     def getvalue(self):
         '''Get the token's value.'''
@@ -313,10 +393,10 @@ class token(queryableaddprop.queryableaddprop):
             argument, otherwise an exception is raised.
         '''
         if index is None:
-            if len(self.args) != 1: raise ValueError('Failed to retrieve token argument because it doesn\'t have exactly one.')
-            return self.args[0]
+            if len(self.arglist) != 1: raise ValueError('Failed to retrieve token argument because it doesn\'t have exactly one.')
+            return self.arglist[0]
         else:
-            return self.args[index]
+            return self.arglist[index]
         
     def equals(self, other):
         '''Returns True if two tokens have identical values and arguments, False otherwise.'''
@@ -326,16 +406,25 @@ class token(queryableaddprop.queryableaddprop):
                 other is not rawstoken.nulltoken and
                 self is not rawstoken.nulltoken and
                 self.value == other.value and
-                self.args == other.args
+                self.arglist == other.arglist
             )
         elif isinstance(other, basestring):
-            return self.equals(rawstoken(pretty=other))
+            return self.equals(tokentemplate.tokentemplate.get(other, singular=True).first())
         else:
             raise TypeError('Failed to check token equivalency against object of type %s.' % type(other))
     
     def copy(self):
         '''Returns a copy of this token.'''
-        return rawstoken(copy=self)
+        copy = object.__new__(rawstoken)
+        setslot = object.__setattr__
+        setslot(copy, 'value', self.value)
+        setslot(copy, 'arglist', self.arglist)
+        setslot(copy, 'prefix', self.prefix)
+        setslot(copy, 'suffix', self.suffix)
+        setslot(copy, 'prev', None)
+        setslot(copy, 'next', None)
+        setslot(copy, 'file', None)
+        return copy
         
     def itokens(self, range=None, reverse=False, until=None, step=None, skip=True):
         '''Iterate through successive tokens starting with this one.'''
@@ -441,15 +530,36 @@ class token(queryableaddprop.queryableaddprop):
         terminators = objects.objectsforheader(header)
         return lambda token, count: (False, token and token.nargs(1) and token.value in terminators)
     
+    def propspan(self):
+        '''
+            Internal: Supports getprop, lastprop, allprop queries. Gets this
+            object token's properties using its file's object index, or None
+            if the token isn't an object token in a file with an object header.
+        '''
+        if self.file is None or not self.file.getobjheaders(): return None
+        try:
+            end = self.file.objindex().propend(self)
+        except KeyError:
+            return None
+        return self.tokens(until=end)
+        
+    def querycache(self):
+        '''
+            Internal: Supports getprop, lastprop, allprop queries. Results
+            are kept by the file the token belongs to, if any.
+        '''
+        return self.file.querycache() if self.file is not None else None
+    
     def remove(self, count=0, reverse=False):
         '''Removes this token and the next count tokens in the direction indicated by reverse.'''
+        if self.file is not None: self.file.touch()
         left = self.prev
         right = self.next
         if count:
             token = self.prev if reverse else self.next
             while count and token:
                 count -= 1
-                token.removed = True
+                token.file = None
                 token = token.prev if reverse else token.next
             if reverse:
                 left = token
@@ -457,6 +567,10 @@ class token(queryableaddprop.queryableaddprop):
                 right = token
         if left: left.next = right
         if right: right.prev = left
+        if self.file is not None:
+            # Don't leave the file's root or tail pointing at a removed token
+            if left is None: self.file.roottoken = right
+            if right is None: self.file.tailtoken = left
         self.file = None
         self.prev = None
         self.next = None
@@ -477,3 +591,4 @@ import tokenlist
 import objects
 import tokenparse
 import helpers
+import tokentemplate
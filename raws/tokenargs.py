@@ -16,24 +16,55 @@ class tokenargs(object):
     
     def __init__(self, items=None):
         '''Construct a new list of token arguments.'''
-        self.list = list()
+        self.owner = None
+        self.items = list()
         if items is not None: self.reset(items)
         
+    @staticmethod
+    def view(owner):
+        '''
+            Internal: Construct a list of token arguments which reads from and
+            writes to the arguments of some token. Tokens store their arguments
+            as tuples which may be shared with other tokens, so changes made
+            through a view replace the token's tuple rather than modifying it.
+        '''
+        args = object.__new__(tokenargs)
+        args.owner = owner
+        args.items = None
+        return args
+        
+    def getlist(self):
+        '''Internal: Get the underlying sequence of arguments.'''
+        return self.items if self.owner is None else self.owner.arglist
+        
+    def setlist(self, items):
+        '''Internal: Replace the underlying sequence of arguments.'''
+        if self.owner is None:
+            self.items = list(items)
+        else:
+            self.owner.setarglist(items)
+            
+    list = property(getlist, setlist)
+        
     def __setitem__(self, item, value):
         '''Set an item in the list.'''
-        self.list[item] = self.sanitize(value)
+        items = list(self.list)
+        items[item] = self.sanitize(value)
+        self.list = items
         
     def __getitem__(self, item):
         '''Get an item from the list.'''
         result = self.list[item]
-        if isinstance(result, list):
+        if isinstance(result, (list, tuple)):
             return tokenargs(result)
         else:
             return result
         
     def __delitem__(self, item):
         '''Remove an item from the list.'''
-        del self.list[item]
+        items = list(self.list)
+        del items[item]
+        self.list = items
         
     def __str__(self):
         '''Get a string representation.'''
@@ -82,7 +113,7 @@ class tokenargs(object):
     
     def __imul__(self, count):
         '''Concatenate the list with itself some number of times.'''
-        self.list *= count
+        self.list = self.list * count
         return self
         
     def __eq__(self, other):
@@ -100,7 +131,7 @@ class tokenargs(object):
         elif isinstance(items, basestring):
             self.reset(items.split(':'))
         else:
-            self.list[:] = self.sanitize(items)
+            self.list = list(self.sanitize(items))
             
     def set(self, index, item=None):
         '''
@@ -110,11 +141,11 @@ class tokenargs(object):
         if item is None:
             item = index
             index = 0
-        self.list[index] = self.sanitize(item)
+        self[index] = item
             
     def clear(self):
         '''Remove all items from the list.'''
-        del self.list[:]
+        self.list = ()
             
     def sanitize(self, value, replace=True):
         '''
@@ -137,18 +168,20 @@ class tokenargs(object):
         
     def append(self, item):
         '''Append a single item to the list.'''
-        self.list.append(self.sanitize(item))
+        self.list = list(self.list) + [self.sanitize(item)]
         
     def extend(self, items):
         '''Append multiple items to the list.'''
         if isinstance(items, basestring):
             self.extend(items.split(':'))
         else:
-            self.list.extend(self.sanitize(items))
+            self.list = list(self.list) + list(self.sanitize(items))
             
     def insert(self, index, item):
         '''Insert an item at some index.'''
-        self.list.insert(index, self.sanitize(item))
+        items = list(self.list)
+        items.insert(index, self.sanitize(item))
+        self.list = items
         
     def add(self, item, *args):
         '''Add an item or items to the end of the list.'''
@@ -162,11 +195,13 @@ class tokenargs(object):
             self.add(args)
             
     def remove(self, item):
-        self.list.remove(self.sanitize(item))
+        items = list(self.list)
+        items.remove(self.sanitize(item))
+        self.list = items
             
     def sub(self, item):
         '''Remove some number of items from the end of the list.'''
         try:
-            self.list[:] = self.list[:-item]
+            self.list = self.list[:-item]
         except:
             self.remove(item)
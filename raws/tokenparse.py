@@ -52,6 +52,57 @@ def parseplural(data, implicit=False, **kwargs):
         
         
         
+def parsebulk(data, file=None):
+    '''Parses the contents of a raws file, turns it into a list of tokens.
+    
+    This is a faster alternative to parseplural intended for text read from
+    disk. Tokens are constructed and linked in the same pass that scans the
+    string for braces, and because the scanner itself guarantees that values,
+    arguments, and prefixes can't contain illegal characters they aren't
+    verified all over again. When the file belongs to a dir, values and
+    arguments are canonicalized using the dir's symbol table. Concatenating
+    the fullstr representations of the resulting tokens gives back exactly
+    the input string.
+    
+    data: The string to be parsed.
+    file: The file object to which the resulting tokens belong.
+    '''
+    
+    tokens = tokenlist.tokenlist()
+    parsed = tokens.content
+    find = data.find
+    create = token.token.unchecked
+    setnext = object.__setattr__
+    symbols = file.dir.symbols if file is not None and file.dir is not None else None
+    internvalue = symboltable.symboltable.value if symbols is not None else str
+    internargs = symbols.args if symbols is not None else tuple
+    prev = None
+    pos = 0
+    
+    if find('[') == -1 and find(']') == -1:
+        raise ValueError('Failed to parse data string because it had no braces and because implicit was set to False.')
+    
+    while True:
+        open = find('[', pos)
+        if open == -1: break
+        close = find(']', open)
+        if close == -1: break
+        tokentext = data[open+1:close]
+        if '[' in tokentext:
+            raise ValueError('Failed to parse data string because the token text "%s" contains an illegal open bracket.' % tokentext)
+        tokenparts = tokentext.split(':')
+        parsetoken = create(internvalue(tokenparts[0]), internargs(tokenparts[1:]), data[pos:open], prev, file)
+        if prev is not None: setnext(prev, 'next', parsetoken)
+        parsed.append(parsetoken)
+        prev = parsetoken
+        pos = close+1
+        
+    if prev is not None and pos < len(data):
+        prev.suffix = data[pos:]
+    return tokens
+        
+        
+        
 def parsesingular(data, implicit=True, failmulti=True, apply=None, **kwargs):
     '''Parses a string containing exactly one token. **kwargs are passed on to the parse static method.
     '''
@@ -100,3 +151,4 @@ def parsevariable(*args, **kwargs):
 
 import token
 import tokenlist
+import symboltable
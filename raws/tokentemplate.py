@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import re
+import threading
+from collections import OrderedDict
+
+
+
+class tokentemplate(object):
+    '''
+        Holds the tokens parsed from a string so that new tokens can be made
+        from it any number of times without parsing the string again. Scripts
+        tend to pass the same few strings to methods like add and addprop over
+        and over, so templates for the most recently used strings are kept in
+        a cache shared by the whole process, and methods accepting strings in
+        place of tokens get their tokens from there. An argument written as a
+        placeholder like {name} can be replaced with a different string each
+        time tokens are made from a template.
+    '''
+
+    cachesize = 256         # Maximum number of templates kept in the cache, or 0 to not keep any
+    maxlength = 1 << 12     # Strings longer than this aren't cached
+    cache = OrderedDict()   # Maps (string, implicit, singular) tuples to templates, least recently used first
+    lock = threading.Lock()
+
+    placeholder = re.compile(r'^\{(\w+)\}$')
+
+    def __init__(self, pretty, implicit=True, singular=False):
+        '''
+            Parse a template from a string. If singular is True the string
+            must contain exactly one token, as when constructing a token from
+            a string, and otherwise it may contain any number of tokens.
+        '''
+        self.pretty = pretty
+        if singular:
+            self.parsed = (rawstoken.token(pretty=pretty),)
+        else:
+            self.parsed = tuple(tokenparse.parseplural(pretty, implicit=implicit))
+        self.placeholders = [] # Tuples of token index, argument index, and name for each placeholder
+        for tokenindex, token in enumerate(self.parsed):
+            for argindex, arg in enumerate(token.arglist):
+                match = tokentemplate.placeholder.match(arg)
+                if match: self.placeholders.append((tokenindex, argindex, match.group(1)))
+
+    def __str__(self):
+        return self.pretty
+
+    def __len__(self):
+        '''Get the number of tokens made each time.'''
+        return len(self.parsed)
+
+    @staticmethod
+    def get(pretty, implicit=True, singular=False):
+        '''Get a template for a string, from the cache when possible.'''
+        if not tokentemplate.cachesize or len(pretty) > tokentemplate.maxlength:
+            return tokentemplate(pretty, implicit=implicit, singular=singular)
+        key = (pretty, implicit, singular)
+        cache = tokentemplate.cache
+        with tokentemplate.lock:
+            template = cache.pop(key, None)
+            if template is not None: cache[key] = template
+        if template is None:
+            template = tokentemplate(pretty, implicit=implicit, singular=singular)
+            with tokentemplate.lock:
+                cache[key] = template
+                while len(cache) > tokentemplate.cachesize: cache.popitem(last=False)
+        return template
+
+    @staticmethod
+    def clear():
+        '''Remove all templates from the cache.'''
+        with tokentemplate.lock:
+            tokentemplate.cache.clear()
+
+    def first(self):
+        '''
+            Internal: Get the first token parsed from the string, or None if
+            there were none. It must not be modified or added anywhere.
+        '''
+        return self.parsed[0] if self.parsed else None
+
+    def tokens(self, **values):
+        '''
+            Make new tokens from the template, linked to each other and to
+            nothing else, and get them in a tokenlist. Named arguments give
+            the strings which replace placeholders; when there are none,
+            placeholders are left as they are.
+        '''
+        tokens = tokenlist.tokenlist()
+        content = tokens.content
+        if values and self.placeholders:
+            args = [list(token.arglist) for token in self.parsed]
+            for tokenindex, argindex, name in self.placeholders:
+                if name not in values:
+                    raise ValueError('Failed to make tokens from template because no value was given for placeholder %s.' % name)
+                args[tokenindex][argindex] = values[name]
+            for index, token in enumerate(self.parsed):
+                content.append(rawstoken.token(
+                    value=token.value, args=args[index], prefix=token.prefix, suffix=token.suffix
+                ))
+        else:
+            create = rawstoken.token.unchecked
+            setslot = object.__setattr__
+            for token in self.parsed:
+                new = create(token.value, token.arglist, token.prefix)
+                if token.suffix is not None: setslot(new, 'suffix', token.suffix)
+                content.append(new)
+        prev = None
+        for token in content:
+            if prev is not None:
+                token.prev = prev
+                prev.next = token
+            prev = token
+        return tokens
+
+    def variable(self, **values):
+        '''
+            Make new tokens from the template like the tokens method, but get
+            just the token when there's exactly one.
+        '''
+        tokens = self.tokens(**values)
+        return tokens[0] if len(tokens) == 1 else tokens
+
+
+
+import token as rawstoken
+import tokenlist
+import tokenparse
@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+
+
+class valueindex(object):
+    '''
+        Internal: Records which tokens in a file have each value, so that
+        queries for tokens with a particular value can skip over all the rest.
+        Files keep one of these and build a new one only when a token has been
+        added, removed, or given a different value since the last.
+    '''
+
+    def __init__(self, root, generation=None):
+        '''Build an index of the tokens starting with a root token.'''
+        self.root = root
+        self.generation = generation
+        self.byvalue = {}       # Maps values to lists of tokens in the order they appear
+        self.positions = None   # Maps ids of tokens to their positions, built when needed
+        token = root
+        while token is not None:
+            tokens = self.byvalue.get(token.value)
+            if tokens is None:
+                self.byvalue[token.value] = [token]
+            else:
+                tokens.append(token)
+            token = token.next
+
+    def tokens(self, values):
+        '''Get the tokens having any of a set of values in the order they appear.'''
+        lists = [self.byvalue[value] for value in values if value in self.byvalue]
+        if not lists:
+            return ()
+        elif len(lists) == 1:
+            return lists[0]
+        else:
+            if self.positions is None:
+                self.positions = {}
+                position = 0
+                token = self.root
+                while token is not None:
+                    self.positions[id(token)] = position
+                    position += 1
+                    token = token.next
+            positions = self.positions
+            return sorted((token for tokens in lists for token in tokens), key=lambda token: positions[id(token)])
@@ -24,9 +24,9 @@ def addtoentity(df, entities, tokens):
         pydwarf.log.debug('Adding tokens to entities %s.' % ', '.join(str(ent) for ent in entities))
         entitytokens = df.allobj(type='ENTITY', id_in=entities)
     
-    for entitytoken in entitytokens:
+    for index, entitytoken in enumerate(entitytokens):
+        if index and isinstance(tokens, raws.queryable): tokens = raws.helpers.copy(tokens) # TODO: What about other iterables containing token objects, e.g. lists and tuples?
         entitytoken.addprop(tokens)
-        if isinstance(tokens, raws.queryable): tokens = raws.helpers.copy(tokens) # TODO: What about other iterables containing token objects, e.g. lists and tuples?
         
     if entities != '*' and len(entitytokens) != len(entities):
         return pydwarf.failure('Failed to add tokens to all given entities because only %d of %d exist.' % (len(entitytokens), len(entities)))
@@ -273,16 +273,7 @@ def addobjects(df, add_to_file, objects, **kwargs):
 )
 def permitobject(df, type=None, id=None, permit_entities=None, all_entities=False, item_rarity=None):
     # Decide what tokens need to be added to the entities based on the object type
-    if type == 'REACTION':
-        tokens = raws.token(value='PERMITTED_REACTION', args=[id])
-    elif type.startswith('BUILDING_'):
-        tokens = raws.token(value='PERMITTED_BUILDING', args=[id])
-    elif type.startswith('ITEM_'):
-        value = type.split('_')[1]
-        args = [id, item_rarity] if item_rarity else [id]
-        tokens = raws.token(value=value, args=args)
-    else:
-        tokens = None
+    tokens = raws.entitypermits.token(type, id, item_rarity)
     
     pydwarf.log.debug('Permitting object [%s:%s] for %s entities.' % (
         type, id, 'all' if all_entities == '*' else len(permit_entities)
@@ -318,16 +309,31 @@ def permitobject(df, type=None, id=None, permit_entities=None, all_entities=Fals
     },
     compatibility = '.*'
 )
-def permitobjects(df, objects, **kwargs):
+def permitobjects(df, objects, permit_entities=None, item_rarity=None, **kwargs):
     pydwarf.log.debug('Permitting %d objects.' % len(objects))
+    items = []
     for item in objects:
         if isinstance(item, raws.token):
-            type, id = item.value, item.arg()
+            items.append((item.value, item.arg()))
         elif isinstance(item, basestring):
-            type, id = item.split(':')
+            items.append(tuple(item.split(':')))
         else:
-            type, id = item
-        response = permitobject(df, type, id, **kwargs)
+            items.append(tuple(item))
+    
+    # Find the entities once, and then add the tokens for every object to each entity at once
+    if permit_entities == '*':
+        entitytokens = df.allobj(type='ENTITY')
+    elif permit_entities:
+        if isinstance(permit_entities, basestring): permit_entities = (permit_entities,)
+        entitytokens = df.allobj(type='ENTITY', id_in=permit_entities)
+    if items and permit_entities and (permit_entities == '*' or len(entitytokens) == len(permit_entities)):
+        tokens = [raws.entitypermits.token(type, id, item_rarity) for type, id in items]
+        raws.entitypermits(entitytokens).permit(token for token in tokens if token is not None)
+        return pydwarf.success('Permitted %d objects.' % len(objects))
+    
+    # Otherwise permit them one at a time, which stops at and reports the first failure
+    for type, id in items:
+        response = permitobject(df, type, id, permit_entities=permit_entities, item_rarity=item_rarity, **kwargs)
         if not response: return response
     return pydwarf.success('Permitted %d objects.' % len(objects))
     
\ No newline at end of file